@@ -0,0 +1,160 @@
+# -*- coding:utf8 -*-
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from Business_App.bz_dishes.models import Dishes
+from horizon import redis
+import pickle
+
+
+# 菜品详情缓存key（按菜品ID）
+DISHES_DETAIL_KEY = 'dishes_detail:%s'
+# 美食城版本号key（版本号加1，则该美食城下所有菜品详情缓存及热销菜品快照失效）
+# 注：菜品由商户端（另一个进程/项目）修改，商户端修改菜品后须调用expire_dishes
+#    （或对consumer缓存数据库中的该key执行INCR），否则只能等缓存过期后更新
+FOOD_COURT_VERSION_KEY = 'dishes_detail:food_court_version:%s'
+# 缓存命中统计（hash类型，字段：hit, miss）
+DISHES_DETAIL_STATS_KEY = 'dishes_detail:stats'
+
+# 菜品详情缓存过期时间（单位：秒），商户端未调用expire_dishes时缓存数据最多延迟这么久
+DISHES_DETAIL_TIMEOUT = 60 * 2
+
+
+class DishesCache(object):
+    """
+    菜品详情缓存（存储在consumer缓存数据库中）
+    缓存数据格式：(美食城版本号, 美食城ID, 菜品详情)
+    """
+    def __init__(self):
+        self.handle = redis.get_redis_connection('consumer')
+
+    def get_food_court_versions(self, food_court_ids):
+        food_court_ids = list(food_court_ids)
+        if not food_court_ids:
+            return {}
+        versions = self.handle.mget([FOOD_COURT_VERSION_KEY % _id for _id in food_court_ids])
+        return {_id: int(version or 0) for _id, version in zip(food_court_ids, versions)}
+
+    def get_dishes_detail(self, dishes_id):
+        return self.get_dishes_detail_dicts([dishes_id])[0]
+
+    def get_dishes_detail_dicts(self, dishes_ids):
+        """
+        批量获取菜品详情，未命中缓存的从数据库中读取并写入缓存
+        返回数据与Dishes.get_dishes_detail_dicts一致
+        """
+        dishes_ids = [int(_id) for _id in dishes_ids]
+        if not dishes_ids:
+            return []
+        try:
+            details = self.get_dishes_detail_dicts_from_cache(dishes_ids)
+        except redis.RedisError:
+            return Dishes.get_dishes_detail_dicts(dishes_ids)
+
+        results = []
+        for dishes_id in dishes_ids:
+            detail = details[dishes_id]
+            if isinstance(detail, Exception):
+                results.append(detail)
+            else:
+                # 返回副本，调用方会修改菜品详情（如：添加count）
+                results.append(dict(detail))
+        return results
+
+    def get_dishes_detail_dicts_from_cache(self, dishes_ids):
+        unique_ids = list(set(dishes_ids))
+        cached = self.handle.mget([DISHES_DETAIL_KEY % _id for _id in unique_ids])
+        entries = {}
+        for dishes_id, value in zip(unique_ids, cached):
+            if value is not None:
+                entries[dishes_id] = pickle.loads(value)
+
+        versions = self.get_food_court_versions(set(item[1] for item in entries.values()))
+        details = {}
+        for dishes_id, (version, food_court_id, detail) in entries.items():
+            if versions.get(food_court_id) == version:
+                details[dishes_id] = detail
+
+        miss_ids = [_id for _id in unique_ids if _id not in details]
+        if miss_ids:
+            # 先读取美食城版本号再读取数据库，读取期间版本号变化时，写入的缓存会因版本号过期而失效
+            miss_versions = self.get_food_court_versions(set(
+                Dishes.objects.filter(pk__in=miss_ids).values_list('food_court_id', flat=True)))
+            miss_details = Dishes.get_dishes_detail_dicts(miss_ids)
+            self.set_dishes_details([item for item in miss_details
+                                     if not isinstance(item, Exception)],
+                                    versions=miss_versions)
+            details.update(dict(zip(miss_ids, miss_details)))
+
+        pipe = self.handle.pipeline(transaction=False)
+        pipe.hincrby(DISHES_DETAIL_STATS_KEY, 'hit', len(unique_ids) - len(miss_ids))
+        pipe.hincrby(DISHES_DETAIL_STATS_KEY, 'miss', len(miss_ids))
+        pipe.execute()
+        return details
+
+    def set_dishes_details(self, details, versions):
+        """
+        写入菜品详情缓存
+        versions: 读取菜品详情之前的美食城版本号 {美食城ID: 版本号}，
+                  不能在读取菜品详情之后再读取，否则期间的版本变化会使旧数据被当作新数据缓存
+        """
+        if not details:
+            return
+        pipe = self.handle.pipeline(transaction=False)
+        for detail in details:
+            if detail['food_court_id'] not in versions:
+                continue
+            value = (versions[detail['food_court_id']], detail['food_court_id'], detail)
+            pipe.set(DISHES_DETAIL_KEY % detail['id'], pickle.dumps(value), ex=DISHES_DETAIL_TIMEOUT)
+        pipe.execute()
+
+    def delete_dishes_detail(self, *dishes_ids):
+        """
+        删除单个（或多个）菜品的详情缓存
+        """
+        if dishes_ids:
+            self.handle.delete(*[DISHES_DETAIL_KEY % _id for _id in dishes_ids])
+
+    def expire_food_court(self, food_court_id):
+        """
+        美食城版本号加1，使该美食城下所有菜品详情缓存失效
+        """
+        return self.handle.incr(FOOD_COURT_VERSION_KEY % food_court_id)
+
+    def get_stats(self):
+        """
+        缓存命中统计
+        """
+        stats = self.handle.hgetall(DISHES_DETAIL_STATS_KEY)
+        hit = int(stats.get('hit', 0))
+        miss = int(stats.get('miss', 0))
+        return {'hit': hit,
+                'miss': miss,
+                'hit_rate': float(hit) / (hit + miss) if hit + miss else 0.0}
+
+    def reset_stats(self):
+        self.handle.delete(DISHES_DETAIL_STATS_KEY)
+
+
+def expire_dishes(food_court_id, *dishes_ids):
+    """
+    菜品修改或删除后，删除菜品的详情缓存，并使美食城的缓存（包括热销菜品快照）失效
+    供修改菜品的一方调用：商户端修改菜品后调用（或执行manage.py expire_dishes_cache），
+    本进程中通过ORM保存的菜品由下面的信号处理
+    """
+    cache = DishesCache()
+    cache.delete_dishes_detail(*dishes_ids)
+    return cache.expire_food_court(food_court_id)
+
+
+@receiver(post_save, sender=Dishes)
+@receiver(post_delete, sender=Dishes)
+def expire_dishes_cache(sender, instance, **kwargs):
+    """
+    本进程中通过ORM保存或删除菜品时使缓存失效
+    注：信号只在本进程中触发，商户端修改的菜品须由商户端调用expire_dishes，
+        否则缓存过期（DISHES_DETAIL_TIMEOUT）后才会更新
+    """
+    try:
+        expire_dishes(instance.food_court_id, instance.pk)
+    except redis.RedisError:
+        pass
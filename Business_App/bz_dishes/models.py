@@ -86,21 +86,52 @@ class Dishes(models.Model):
         #     filter_dict = {'user_id': request.user.id}
         filter_dict = {'food_court_id': kwargs['food_court_id'],'is_recommend': 1}
         try:
-            hot_objects = cls.objects.filter(**filter_dict)
-            dishes_list = []
-            for item in  hot_objects:
-                dishe = cls.get_dishes_detail_dict_with_user_info(pk=item.pk)
-                dishes_list.append(dishe)
+            from Business_App.bz_dishes.caches import DishesCache
 
-            return dishes_list
+            hot_ids = cls.objects.filter(**filter_dict).values_list('pk', flat=True)
+            return DishesCache().get_dishes_detail_dicts(list(hot_ids))
         except Exception as e:
             return e
+
     @classmethod
     def get_dishes_detail_dict_with_user_info(cls, **kwargs):
         instance = cls.get_object(**kwargs)
         if isinstance(instance, Exception):
             return instance
         user = BusinessUser.get_object(pk=instance.user_id)
+        # 获取美食城信息
+        food_instance = FoodCourt.get_object(pk=user.food_court_id)
+        return cls.make_dishes_detail_dict(instance, user, food_instance)
+
+    @classmethod
+    def get_dishes_detail_dicts(cls, dishes_ids):
+        """
+        批量获取菜品详情（最多3次查询：菜品、商户、美食城，商户及美食城信息优先读取进程内缓存）
+        返回数据与dishes_ids顺序一致，菜品不存在的位置为Dishes.DoesNotExist实例
+        """
+        dishes_ids = list(dishes_ids)
+        if not dishes_ids:
+            return []
+        dishes_dict = {item.pk: item
+                       for item in cls.objects.filter(pk__in=set(dishes_ids))}
+        users_dict = BusinessUser.get_objects_dict(
+            item.user_id for item in dishes_dict.values())
+        food_courts_dict = FoodCourt.get_objects_dict(
+            item.food_court_id for item in users_dict.values())
+
+        details = []
+        for dishes_id in dishes_ids:
+            instance = dishes_dict.get(int(dishes_id))
+            if instance is None:
+                details.append(cls.DoesNotExist('Dishes ID %s does not existed' % dishes_id))
+                continue
+            user = users_dict.get(instance.user_id)
+            food_instance = food_courts_dict.get(getattr(user, 'food_court_id', None))
+            details.append(cls.make_dishes_detail_dict(instance, user, food_instance))
+        return details
+
+    @classmethod
+    def make_dishes_detail_dict(cls, instance, user, food_instance):
         dishes_dict = model_to_dict(instance)
         dishes_dict['business_name'] = getattr(user, 'business_name', '')
         dishes_dict['business_id'] = dishes_dict['user_id']
@@ -112,8 +143,6 @@ class Dishes(models.Model):
         dishes_dict['image_url'] = os.path.join(settings.WEB_URL_FIX,
                                                 'static',
                                                 base_dir)
-        # 获取美食城信息
-        food_instance = FoodCourt.get_object(pk=user.food_court_id)
         dishes_dict['food_court_name'] = getattr(food_instance, 'name', '')
         dishes_dict['food_court_id'] = getattr(food_instance, 'id', None)
 
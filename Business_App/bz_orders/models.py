@@ -3,6 +3,12 @@ from __future__ import unicode_literals
 from django.db import models
 from django.utils.timezone import now
 from django.db import transaction
+from horizon import redis
+from horizon.counters import (RedisDailyCounter,
+                              is_redis_backend,
+                              DATABASE_FALLBACK_START)
+import os
+import threading
 
 
 def date_for_model():
@@ -13,6 +19,42 @@ def ordersIdIntegerToString(orders_id):
     return "%06d" % orders_id
 
 
+# 每次从数据库预留的订单号数量（进程内依次分配，用完后再预留下一段）
+ORDERS_ID_BLOCK_SIZE = 50
+
+
+class OrdersIdBlock(object):
+    """
+    进程内已预留的订单号段：[next_id, end_id]
+    """
+    def __init__(self):
+        self.date = None
+        self.next_id = 0
+        self.end_id = -1
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def is_available(self, date_day):
+        # fork出的子进程不能使用父进程预留的号段，否则会产生重复订单号
+        return (self.date == date_day and self.pid == os.getpid() and
+                self.next_id <= self.end_id)
+
+    def reset(self, date_day, start_id, end_id):
+        self.date = date_day
+        self.next_id = start_id
+        self.end_id = end_id
+        self.pid = os.getpid()
+
+    def pop(self):
+        orders_id = self.next_id
+        self.next_id += 1
+        return orders_id
+
+
+_orders_id_block = OrdersIdBlock()
+_orders_id_counter = RedisDailyCounter('orders_id')
+
+
 class OrdersIdGenerator(models.Model):
     date = models.DateField('日期', primary_key=True, default=date_for_model)
     orders_id = models.IntegerField('订单ID', default=1)
@@ -27,19 +69,67 @@ class OrdersIdGenerator(models.Model):
         return str(self.date)
 
     @classmethod
-    def get_orders_id(cls):
-        date_day = date_for_model()
-        orders_id = 0
+    def reserve_orders_id_block(cls, date_day, block_size=ORDERS_ID_BLOCK_SIZE, min_id=0):
+        """
+        预留一段订单号（订单号大于min_id），返回：(起始订单号, 结束订单号)
+        数据库中记录的是当天已分配出去的最大订单号
+        """
         # 数据库加排它锁，保证订单号是唯一的
         with transaction.atomic(using='business'):   # 多数据库事务管理需显示声明操作的数据库（以后的版本可能会改进）
             try:
                 _instance = cls.objects.select_for_update().get(pk=date_day)
             except cls.DoesNotExist:
-                cls().save()
-                orders_id = 1
+                start_id = min_id + 1
+                cls(date=date_day, orders_id=start_id + block_size - 1).save(force_insert=True)
             else:
-                orders_id = _instance.orders_id + 1
-                _instance.orders_id = orders_id
+                start_id = max(_instance.orders_id, min_id) + 1
+                _instance.orders_id = start_id + block_size - 1
                 _instance.save()
+        return start_id, start_id + block_size - 1
+
+    @classmethod
+    def get_database_orders_id(cls, date_day):
+        """
+        从数据库预留的号段中分配订单号
+        （使用缓存服务器生成订单号时，数据库只分配DATABASE_FALLBACK_START之后的订单号）
+        """
+        min_id = DATABASE_FALLBACK_START if is_redis_backend() else 0
+        with _orders_id_block.lock:
+            if not _orders_id_block.is_available(date_day) or _orders_id_block.next_id <= min_id:
+                start_id, end_id = cls.reserve_orders_id_block(date_day, min_id=min_id)
+                _orders_id_block.reset(date_day, start_id, end_id)
+            return _orders_id_block.pop()
+
+    @classmethod
+    def get_database_seed(cls, date_day):
+        """
+        当天数据库方式已分配的最大订单号（不包括备用号段）
+        """
+        orders_ids = cls.objects.filter(pk=date_day).values_list('orders_id', flat=True)
+        if orders_ids and orders_ids[0] < DATABASE_FALLBACK_START:
+            return orders_ids[0]
+        return 0
+
+    @classmethod
+    def get_orders_id(cls, get_max_issued_id=None):
+        """
+        get_max_issued_id: 返回当天已写入订单表的最大订单号（整数部分）的函数，
+                           缓存服务器的计数key不存在时，计数从该订单号及数据库已分配的订单号之后开始
+        """
+        date_day = date_for_model()
+        orders_id = None
+        if is_redis_backend():
+            def get_seed():
+                seed = cls.get_database_seed(date_day)
+                if get_max_issued_id is not None:
+                    seed = max(seed, get_max_issued_id(date_day))
+                return seed
+            try:
+                orders_id = _orders_id_counter.next_value(date_day, get_seed)
+            except (redis.RedisError, OverflowError):
+                # 缓存服务器不可用时，使用数据库生成订单号
+                orders_id = None
+        if orders_id is None:
+            orders_id = cls.get_database_orders_id(date_day)
         orders_id_string = ordersIdIntegerToString(orders_id)
         return '%s%s' % (date_day.strftime('%Y%m%d'), orders_id_string)
@@ -3,12 +3,52 @@ from django.db import models
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
 from django.utils.timezone import now
 from django.contrib.auth.hashers import make_password
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from horizon.models import model_to_dict
+from horizon.caches import LocalCache
 from django.conf import settings
+import copy
 import datetime
 import os
 
 
+# 商户及美食城信息很少变动，按主键缓存在进程内（每个进程的内存占用由maxsize限定），
+# 各进程的命中统计见：manage.py local_cache_stats
+# 注：本进程中保存的数据由信号删除缓存，商户端（另一个进程/项目）修改的数据在缓存过期（10分钟）后更新
+business_user_cache = LocalCache(maxsize=2000, timeout=60 * 10, name='business_user')
+food_court_cache = LocalCache(maxsize=200, timeout=60 * 10, name='food_court')
+
+
+def get_cached_object(model, cache, pk):
+    instance = cache.get(pk)
+    if instance is None:
+        instance = model.objects.get(pk=pk)
+        cache.set(pk, instance)
+    # 返回副本，防止调用方修改缓存中的实例
+    return copy.copy(instance)
+
+
+def get_cached_objects_dict(model, cache, pks):
+    """
+    批量获取数据（未命中缓存的数据一次查询获取）
+    返回数据格式：{pk: instance, ...}
+    """
+    objects_dict = {}
+    miss_pks = []
+    for pk in set(pks):
+        instance = cache.get(pk)
+        if instance is None:
+            miss_pks.append(pk)
+        else:
+            objects_dict[pk] = copy.copy(instance)
+    if miss_pks:
+        for instance in model.objects.filter(pk__in=miss_pks):
+            cache.set(instance.pk, instance)
+            objects_dict[instance.pk] = copy.copy(instance)
+    return objects_dict
+
+
 class BusinessUserManager(BaseUserManager):
     def create_user(self, username, password, business_name, food_court_id, **kwargs):
         """
@@ -78,10 +118,26 @@ class BusinessUser(AbstractBaseUser):
     @classmethod
     def get_object(cls, **kwargs):
         try:
+            if list(kwargs) == ['pk']:
+                return get_cached_object(cls, business_user_cache, kwargs['pk'])
             return cls.objects.get(**kwargs)
         except cls.DoesNotExist:
             return None
 
+    @classmethod
+    def get_objects_dict(cls, pks):
+        return get_cached_objects_dict(cls, business_user_cache, pks)
+
+    @classmethod
+    def expire_cache(cls, *pks):
+        """
+        商户信息变更后，删除进程内缓存（不传pk则清空缓存）
+        """
+        if pks:
+            business_user_cache.delete(*pks)
+        else:
+            business_user_cache.clear()
+
     @classmethod
     def get_user_detail(cls, request):
         """
@@ -135,15 +191,40 @@ class FoodCourt(models.Model):
     @classmethod
     def get_object(cls, **kwargs):
         try:
+            if list(kwargs) == ['pk']:
+                return get_cached_object(cls, food_court_cache, kwargs['pk'])
             return cls.objects.get(**kwargs)
         except Exception as e:
             return e
 
+    @classmethod
+    def get_objects_dict(cls, pks):
+        return get_cached_objects_dict(cls, food_court_cache, pks)
+
+    @classmethod
+    def expire_cache(cls, *pks):
+        """
+        美食城信息变更后，删除进程内缓存（不传pk则清空缓存）
+        """
+        if pks:
+            food_court_cache.delete(*pks)
+        else:
+            food_court_cache.clear()
+
     @classmethod
     def get_object_list(cls, **kwargs):
-        if 'page_size' in kwargs:
-            kwargs.pop('page_size')
-        if 'page_index' in kwargs:
-            kwargs.pop('page_index')
+        for key in ('page_size', 'page_index', 'paging_mode', 'cursor', 'with_count'):
+            kwargs.pop(key, None)
         return cls.objects.filter(**kwargs)
 
+
+@receiver(post_save, sender=BusinessUser)
+@receiver(post_delete, sender=BusinessUser)
+def expire_business_user_cache(sender, instance, **kwargs):
+    BusinessUser.expire_cache(instance.pk)
+
+
+@receiver(post_save, sender=FoodCourt)
+@receiver(post_delete, sender=FoodCourt)
+def expire_food_court_cache(sender, instance, **kwargs):
+    FoodCourt.expire_cache(instance.pk)
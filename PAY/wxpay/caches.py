@@ -0,0 +1,35 @@
+# -*- coding:utf8 -*-
+from horizon import redis
+
+
+# 已处理的支付结果通知key（商户订单号, 微信支付订单号）
+NOTIFY_SETTLED_KEY = 'wxpay_notify_settled:%s:%s'
+
+# 已处理通知的保存时间（大于微信支付重复通知的时间范围），单位：秒
+NOTIFY_SETTLED_TIMEOUT = 60 * 60 * 24 * 2
+
+
+class WXPayNotifyCache(object):
+    """
+    微信支付结果通知去重（存储在consumer缓存数据库中）
+    已处理的通知再次收到时直接返回成功，不再读写订单数据
+    """
+    def __init__(self):
+        self.handle = redis.get_redis_connection('consumer')
+
+    def make_key(self, data_dict):
+        return NOTIFY_SETTLED_KEY % (data_dict.get('out_trade_no', ''),
+                                     data_dict.get('transaction_id', ''))
+
+    def is_settled(self, data_dict):
+        try:
+            return bool(self.handle.exists(self.make_key(data_dict)))
+        except redis.RedisError:
+            return False
+
+    def set_settled(self, data_dict):
+        try:
+            self.handle.set(self.make_key(data_dict), data_dict.get('result_code', ''),
+                            ex=NOTIFY_SETTLED_TIMEOUT)
+        except redis.RedisError:
+            pass
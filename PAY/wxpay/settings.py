@@ -6,13 +6,26 @@ import os
 # 统一下单URL
 UNIFIED_ORDER_URL = 'https://api.mch.weixin.qq.com/pay/unifiedorder'
 
+# 请求微信支付接口的超时时间（连接超时, 读取超时），单位：秒
+HTTP_TIMEOUT = (3, 10)
+# 连接微信支付接口失败时的重试次数
+HTTP_RETRIES = 2
+# 每个进程与微信支付接口保持的最大连接数
+HTTP_POOL_MAXSIZE = 10
+
+# 每个进程中调用统一下单接口的线程数及最多排队的请求数
+JSAPI_WORKERS = 8
+JSAPI_MAX_PENDING = 32
+# 请求处理进程等待统一下单结果的最长时间（单位：秒），超时后客户端需再次请求获取结果
+JSAPI_WAIT_TIMEOUT = 3
+
 # 公众账号ID
 APPID = 'wx55da5a50194f8c73'
 
 # 商户号
 MCH_ID = '1448533802'
 
-# 签名类型
+# 签名类型：MD5 或 HMAC-SHA256
 SIGN_TYPE = 'MD5'
 
 # 调用微信支付的服务器IP地址
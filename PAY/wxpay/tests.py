@@ -0,0 +1,104 @@
+# -*- coding:utf8 -*-
+from django.test import SimpleTestCase
+from PAY.wxpay import settings as wx_settings
+from PAY.wxpay.models import WXPayResult
+from PAY.wxpay.views import JsApiCallback
+from horizon import main
+from hashlib import md5
+import json
+
+
+def legacy_make_sign_for_wxpay(source_dict):
+    """
+    之前的签名方式（列表排序 + 字符串逐个拼接，只支持MD5）
+    """
+    key_list = []
+    for _key in source_dict:
+        if not source_dict[_key] or _key == 'sign':
+            continue
+        key_list.append({'key': _key, 'value': source_dict[_key]})
+    key_list.sort(key=lambda x: x['key'])
+
+    string_param = ''
+    for item in key_list:
+        string_param += '%s=%s&' % (item['key'], item['value'])
+    string_param += 'key=%s' % wx_settings.KEY
+    md5_string = md5(string_param.encode('utf8')).hexdigest()
+    return md5_string.upper()
+
+
+def legacy_verify_sign_for_wxpay(source_dict, sign):
+    return legacy_make_sign_for_wxpay(source_dict) == sign
+
+
+def make_notify_data(sign_type='MD5'):
+    """
+    微信支付结果通知的数据（已签名）
+    """
+    data_dict = {'appid': 'wx2421b1c4370ec43b',
+                 'attach': u'支付测试',
+                 'bank_type': 'CFT',
+                 'fee_type': 'CNY',
+                 'is_subscribe': 'Y',
+                 'mch_id': '10000100',
+                 'nonce_str': '5d2b6c2a8db53831f7eda20af46e531c',
+                 'openid': 'oUpF8uMEb4qRXf22hE3X68TekukE',
+                 'out_trade_no': '20170519000123',
+                 'result_code': 'SUCCESS',
+                 'return_code': 'SUCCESS',
+                 'sub_mch_id': '10000100',
+                 'time_end': '20170519094037',
+                 'total_fee': '3000',
+                 'cash_fee': '3000',
+                 'trade_type': 'JSAPI',
+                 'transaction_id': '1004400740201409030005092168'}
+    data_dict['sign'] = main.make_sign_for_wxpay(data_dict, sign_type)
+    return data_dict
+
+
+class FakeWXPayResult(object):
+    request_data = json.dumps({'total_fee': 3000})
+
+
+def use_fake_pay_result():
+    """
+    用FakeWXPayResult替换数据库中的支付请求记录，返回被替换的方法（用于恢复）
+    """
+    origin_get_object = WXPayResult.__dict__['get_object_by_orders_id']
+    WXPayResult.get_object_by_orders_id = staticmethod(lambda orders_id: FakeWXPayResult())
+    return origin_get_object
+
+
+def restore_pay_result(origin_get_object):
+    WXPayResult.get_object_by_orders_id = origin_get_object
+
+
+def is_sign_valid(data_dict):
+    return JsApiCallback().is_sign_valid(dict(data_dict))
+
+
+class SignTestCase(SimpleTestCase):
+    def setUp(self):
+        self.origin_get_object = use_fake_pay_result()
+
+    def tearDown(self):
+        restore_pay_result(self.origin_get_object)
+
+    def test_same_sign_as_legacy(self):
+        data_dict = make_notify_data()
+        self.assertEqual(main.make_sign_for_wxpay(data_dict, 'MD5'),
+                         legacy_make_sign_for_wxpay(data_dict))
+
+    def test_verify(self):
+        for sign_type in ('MD5', 'HMAC-SHA256'):
+            data_dict = make_notify_data(sign_type)
+            self.assertTrue(main.verify_sign_for_wxpay(data_dict, data_dict['sign'], sign_type))
+            data_dict['total_fee'] = '1'
+            self.assertFalse(main.verify_sign_for_wxpay(data_dict, data_dict['sign'], sign_type))
+        self.assertFalse(main.verify_sign_for_wxpay(make_notify_data(), None))
+
+    def test_is_sign_valid(self):
+        data_dict = make_notify_data(wx_settings.SIGN_TYPE)
+        self.assertTrue(is_sign_valid(data_dict))
+        data_dict['cash_fee'] = '1'
+        self.assertFalse(is_sign_valid(data_dict))
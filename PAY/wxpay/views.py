@@ -3,11 +3,13 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.settings import APISettings, DEFAULTS, IMPORT_STRINGS
+from django.db import transaction, IntegrityError
 
 from horizon import main
 from PAY.wxpay.models import WXPayResult
 from PAY.wxpay.serializers import ResponseSerializer
-from orders.models import PayOrders
+from PAY.wxpay.caches import WXPayNotifyCache
+from orders.models import PayOrders, PaymentStatusError
 from orders.views import BaseConsumeOrders
 import json
 import copy
@@ -54,38 +56,67 @@ class JsApiCallback(APIView):
                            'return_msg': 'OK'}
         fail_message = {'return_code': 'FAIL',
                         'return_msg': 'SIGN INCORRECT'}
+        error_message = {'return_code': 'FAIL',
+                         'return_msg': 'SYSTEM ERROR'}
         success_data = {'payment_status': 200,
                         'payment_mode': 2}
         fail_data = {'payment_status': 500,
-                     'payment_code': 2}
+                     'payment_mode': 2}
 
         data_dict = main.anaysize_xml_to_dict(request.body)
         # 微信支付时返回通讯失败
         if data_dict['return_code'] == 'FAIL':
             return Response(main.make_dict_to_xml(fail_message), status=status.HTTP_200_OK)
+
+        return_xml = main.make_dict_to_xml(success_message, use_cdata=True)
+        # 重复的通知（已处理过）验证签名后直接返回成功，不再读写订单数据
+        # （支付成功的通知只在确认子订单已拆分后才记录为已处理）
+        notify_cache = WXPayNotifyCache()
+        if notify_cache.is_settled(data_dict) and \
+                main.verify_sign_for_wxpay(data_dict, data_dict.get('sign')):
+            return Response(return_xml, status=status.HTTP_200_OK)
+
         if not self.is_sign_valid(data_dict):
             return Response(main.make_dict_to_xml(fail_message), status=status.HTTP_200_OK)
 
-        return_xml = main.make_dict_to_xml(success_message, use_cdata=True)
         if data_dict['result_code'] == 'SUCCESS':
+            # 更新支付状态与拆分子订单在同一个事务中，拆分失败时一并回滚并返回失败，等待微信支付重新通知
+            # （其它异常不捕获，返回500，微信支付同样会重新通知）
+            is_repeated = False
             try:
-                PayOrders.update_payment_status_by_pay_callback(
-                    orders_id=self._orders_id,
-                    validated_data=success_data)
-            except:
+                with transaction.atomic():
+                    try:
+                        PayOrders.update_payment_status_by_pay_callback(
+                            orders_id=self._orders_id,
+                            validated_data=success_data)
+                    except (PayOrders.DoesNotExist, PaymentStatusError):
+                        # 重复通知：订单已是已支付状态时，仍需确认子订单已拆分（未拆分的补拆分）
+                        pay_orders = PayOrders.get_object(orders_id=self._orders_id)
+                        # 订单不存在或未支付成功（没有子订单）时，不记录为已处理的通知
+                        if isinstance(pay_orders, Exception) or pay_orders.payment_status != 200:
+                            return Response(return_xml, status=status.HTTP_200_OK)
+                        is_repeated = True
+                    # 拆分主订单为子订单（已拆分过的不再重复拆分）
+                    consume_orders = BaseConsumeOrders().create(self._orders_id)
+                    if not isinstance(consume_orders, list):
+                        transaction.set_rollback(True)
+                        return Response(main.make_dict_to_xml(error_message), status=status.HTTP_200_OK)
+            except IntegrityError:
+                # 同一订单的并发通知已拆分子订单并提交（子订单ID唯一），由该通知记录为已处理
+                return Response(return_xml, status=status.HTTP_200_OK)
+            if is_repeated:
+                notify_cache.set_settled(data_dict)
                 return Response(return_xml, status=status.HTTP_200_OK)
-            else:
-                # 支付成功后，拆分主订单为子订单
-                BaseConsumeOrders().create(self._orders_id)
         else:
             try:
                 PayOrders.update_payment_status_by_pay_callback(
                     orders_id=self._orders_id,
                     validated_data=fail_data)
-            except:
+            except (PayOrders.DoesNotExist, PaymentStatusError):
                 return Response(return_xml, status=status.HTTP_200_OK)
         serializer = ResponseSerializer(self._wx_instance)
         serializer.update_wxpay_result(self._wx_instance, data_dict)
+        notify_cache.set_settled(data_dict)
         return Response(return_xml, status=status.HTTP_200_OK)
 
     def is_sign_valid(self, request_data):
@@ -106,10 +137,5 @@ class JsApiCallback(APIView):
         param_dict = json.loads(instance.request_data)
         if int(request_data['total_fee']) != int(param_dict['total_fee']):
             return False
-        sign = request_data.pop('sign')
-
-        _sign = main.make_sign_for_wxpay(request_data)
-        if _sign == sign:
-            return True
-        else:
-            return False
+        sign = request_data.pop('sign', None)
+        return main.verify_sign_for_wxpay(request_data, sign)
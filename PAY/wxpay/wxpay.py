@@ -1,10 +1,10 @@
 #-*- coding:utf8 -*-
 
-import requests
 from PAY.wxpay import settings as wx_settings
 from django.conf import settings as app_settings
+from horizon.http_requests import HttpClient
+from horizon import main
 import uuid
-from hashlib import md5
 from lxml import etree
 
 
@@ -32,6 +32,12 @@ FIELDS = ('appid',              # 公众账号ID
           )
 
 
+# 请求微信支付接口的http客户端（连接池复用连接，统计请求耗时：wxpay_http_client.stats()）
+wxpay_http_client = HttpClient(timeout=wx_settings.HTTP_TIMEOUT,
+                               retries=wx_settings.HTTP_RETRIES,
+                               pool_maxsize=wx_settings.HTTP_POOL_MAXSIZE)
+
+
 class WXPAYUnifiedOrder(object):
     """
     统一下单支付模式（微信支付入口  注：除了刷卡支付，刷卡支付有单独的支付入口）
@@ -65,19 +71,7 @@ class WXPAYUnifiedOrder(object):
         """
         生成签名
         """
-        key_list = []
-        for _key in self.__dict__:
-            if getattr(self, _key):
-                key_list.append({'key': _key, 'value': getattr(self, _key)})
-        key_list.sort(key=lambda x: x['key'])
-
-        string_param = ''
-        for item in key_list:
-            string_param += '%s=%s&' % (item['key'], item['value'])
-        # 把密钥和其它参数组合起来
-        string_param += 'key=%s' % wx_settings.KEY
-        md5_string = md5(string_param.encode('utf8')).hexdigest()
-        return md5_string.upper()
+        return main.make_sign_for_wxpay(self.__dict__)
 
     @property
     def xml(self):
@@ -103,9 +97,9 @@ class WXPAYUnifiedOrder(object):
 
     def go_to_pay(self):
         headers = {'Content-Type': 'text/xml; charset=UTF-8'}
-        results = requests.post(wx_settings.UNIFIED_ORDER_URL,
-                                data=self.xml,
-                                headers=headers)
+        results = wxpay_http_client.post(wx_settings.UNIFIED_ORDER_URL,
+                                         data=self.xml,
+                                         headers=headers)
         return results
 
 
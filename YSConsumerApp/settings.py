@@ -212,5 +212,16 @@ REDIS_SETTINGS = {
     'db_set': {
         'business': 0,
         'consumer': 1,
-        }
-}
\ No newline at end of file
+        'counter': 2,
+        },
+    # 单独配置的缓存服务器（未配置的使用上面的host、port），如：{'counter': {'host': ..., 'port': ...}}
+    #   counter：订单号及交易流水号计数，所在的缓存服务器须配置maxmemory-policy noeviction，
+    #            淘汰策略不是noeviction时不使用缓存服务器计数（使用数据库生成）
+    'servers': {},
+}
+
+# 订单号及交易流水号生成方式（默认为database）：
+#   redis：缓存服务器按天计数（缓存服务器不可用时，使用数据库生成备用号段的编号），
+#          须先按上面的说明配置counter所在的缓存服务器
+#   database：数据库加锁生成
+ID_GENERATOR_BACKEND = 'database'
@@ -0,0 +1,127 @@
+# -*- coding:utf8 -*-
+from collections import OrderedDict
+from horizon import redis
+import json
+import os
+import socket
+import threading
+import time
+
+
+# 进程内缓存的统计（consumer缓存数据库，hash类型，字段：主机名:进程ID，值：json格式的统计数据）
+LOCAL_CACHE_STATS_KEY = 'local_cache_stats:%s'
+# 每个进程上报统计的间隔（单位：秒）
+LOCAL_CACHE_STATS_INTERVAL = 60
+# 统计key的过期时间（单位：秒），所有进程都停止上报后自动删除
+LOCAL_CACHE_STATS_TIMEOUT = 60 * 60
+
+# 已命名的进程内缓存：{缓存名称: LocalCache}
+local_caches = {}
+
+
+class LocalCache(object):
+    """
+    进程内缓存（LRU + 过期时间），用于很少变动的数据
+    maxsize: 最多缓存的条目数，超出后淘汰最久未使用的条目
+    timeout: 每个条目的有效时间（单位：秒）
+    name: 缓存名称，指定后每个进程定期将统计数据上报到缓存服务器（见get_local_cache_stats）
+    """
+    def __init__(self, maxsize=1000, timeout=60 * 5, name=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.name = name
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._reported = 0
+        if name:
+            local_caches[name] = self
+
+    def get(self, key, default=None):
+        value = self._get(key, default)
+        self.report_stats()
+        return value
+
+    def _get(self, key, default):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                self._misses += 1
+                return default
+            value, expires = item
+            if expires <= time.time():
+                self._expirations += 1
+                self._misses += 1
+                return default
+            # 重新放入，标记为最近使用
+            self._data[key] = item
+            self._hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, time.time() + timeout)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            requests = self._hits + self._misses
+            return {'size': len(self._data),
+                    'maxsize': self.maxsize,
+                    'timeout': self.timeout,
+                    'hits': self._hits,
+                    'misses': self._misses,
+                    'evictions': self._evictions,
+                    'expirations': self._expirations,
+                    'hit_rate': float(self._hits) / requests if requests else 0.0}
+
+    def report_stats(self):
+        """
+        上报本进程的统计数据（每个进程每LOCAL_CACHE_STATS_INTERVAL秒最多上报一次）
+        """
+        now = time.time()
+        if not self.name or now - self._reported < LOCAL_CACHE_STATS_INTERVAL:
+            return
+        self._reported = now
+        stats = self.stats()
+        stats['reported'] = int(now)
+        key = LOCAL_CACHE_STATS_KEY % self.name
+        try:
+            pipe = redis.get_redis_connection('consumer').pipeline(transaction=False)
+            pipe.hset(key, '%s:%s' % (socket.gethostname(), os.getpid()), json.dumps(stats))
+            pipe.expire(key, LOCAL_CACHE_STATS_TIMEOUT)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+
+def get_local_cache_stats(name, max_age=LOCAL_CACHE_STATS_INTERVAL * 5):
+    """
+    各进程上报的统计数据（忽略超过max_age秒未上报的进程）
+    返回数据格式：{主机名:进程ID: 统计数据, ...}
+    """
+    results = {}
+    now = time.time()
+    items = redis.get_redis_connection('consumer').hgetall(LOCAL_CACHE_STATS_KEY % name)
+    for worker, value in items.items():
+        stats = json.loads(value)
+        if now - stats['reported'] <= max_age:
+            results[worker] = stats
+    return results
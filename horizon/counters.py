@@ -0,0 +1,114 @@
+# -*- coding:utf8 -*-
+from django.conf import settings
+from horizon import redis
+import os
+
+
+# 计数key的过期时间（按天计数，保留2天）
+COUNTER_TIMEOUT = 60 * 60 * 24 * 2
+
+# 缓存服务器每天可分配的编号为：1 ~ DATABASE_FALLBACK_START - 1，
+# 缓存服务器不可用时，数据库从DATABASE_FALLBACK_START + 1开始分配，两者不会重复
+DATABASE_FALLBACK_START = 500000
+
+# 计数使用的缓存数据库（settings.REDIS_SETTINGS['db_set']中的名称），
+# 所在的缓存服务器须配置maxmemory-policy为noeviction，否则不使用缓存服务器计数
+COUNTER_DB_NAME = 'counter'
+
+# 计数key初始化时，在已写入数据库的最大编号基础上跳过的编号数量
+# （计数key丢失前已分配、但订单尚未写入数据库的编号）
+SEED_MARGIN = 1000
+
+# 计数key存在时加1，不存在时返回nil（由调用方重新计算初始值）
+INCR_EXISTING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCR', KEYS[1])
+end
+return nil
+"""
+
+# 缓存数据库淘汰策略的检查结果：{(进程ID, 缓存数据库名称): None（可用于计数）或CounterStoreNotSafe}
+# 检查不通过的结果同样缓存，不再每次生成编号都请求CONFIG GET
+_checked_stores = {}
+
+
+class CounterStoreNotSafe(redis.RedisError):
+    """
+    计数所在的缓存服务器可能淘汰数据（maxmemory-policy不是noeviction）
+    """
+
+
+def is_redis_backend():
+    """
+    订单号及交易流水号是否使用缓存服务器生成（settings.ID_GENERATOR_BACKEND）
+    """
+    return getattr(settings, 'ID_GENERATOR_BACKEND', 'database') == 'redis'
+
+
+def get_max_issued_number(queryset, field_name, prefix):
+    """
+    数据库中已写入的、以prefix开头的最大编号（不包括备用号段），
+    如：订单号"20170519000123"，prefix为"20170519"时返回123
+    """
+    values = (queryset.filter(**{'%s__startswith' % field_name: prefix,
+                                 '%s__lt' % field_name: '%s%06d' % (prefix, DATABASE_FALLBACK_START)})
+              .order_by('-%s' % field_name).values_list(field_name, flat=True)[:1])
+    for value in values:
+        return int(value[len(prefix):])
+    return 0
+
+
+def check_counter_store(handle, db_name=COUNTER_DB_NAME):
+    """
+    检查缓存服务器的淘汰策略（每个进程检查一次），可能淘汰数据或无法检查（CONFIG命令被禁用）时
+    抛出CounterStoreNotSafe
+    """
+    store_key = (os.getpid(), db_name)
+    if store_key not in _checked_stores:
+        try:
+            policy = handle.config_get('maxmemory-policy').get('maxmemory-policy')
+        except redis.ResponseError as e:
+            _checked_stores[store_key] = CounterStoreNotSafe('Cannot get Redis maxmemory-policy: %s' % e)
+        else:
+            if policy != 'noeviction':
+                _checked_stores[store_key] = CounterStoreNotSafe(
+                    'Redis maxmemory-policy is %s, expected noeviction' % policy)
+            else:
+                _checked_stores[store_key] = None
+    if _checked_stores[store_key] is not None:
+        raise _checked_stores[store_key]
+
+
+class RedisDailyCounter(object):
+    """
+    按天计数（缓存服务器INCR，计数key按天区分并自动过期）
+    计数key不存在（当天首次计数，或缓存服务器重启等导致key丢失）时，
+    由数据库中已持久化的最大编号 + SEED_MARGIN重新初始化，不会分配已使用过的编号
+    """
+    def __init__(self, name, db_name=COUNTER_DB_NAME):
+        self.name = name
+        self.db_name = db_name
+        # 计数脚本（首次计数时注册，之后复用）
+        self.incr_existing = None
+
+    def make_key(self, date_day):
+        return '%s:%s' % (self.name, date_day.strftime('%Y%m%d'))
+
+    def next_value(self, date_day, get_seed):
+        """
+        get_seed: 返回当天已持久化的最大编号的函数，计数key不存在时用于初始化
+        """
+        handle = redis.get_redis_connection(self.db_name)
+        check_counter_store(handle, self.db_name)
+        key = self.make_key(date_day)
+        if self.incr_existing is None:
+            self.incr_existing = handle.register_script(INCR_EXISTING_SCRIPT)
+        value = self.incr_existing(keys=[key], client=handle)
+        if value is None:
+            pipe = handle.pipeline(transaction=True)
+            pipe.set(key, get_seed() + SEED_MARGIN, ex=COUNTER_TIMEOUT, nx=True)
+            pipe.incr(key)
+            value = pipe.execute()[1]
+        if value >= DATABASE_FALLBACK_START:
+            raise OverflowError('Counter %s is out of range' % key)
+        return value
@@ -0,0 +1,51 @@
+# -*- coding:utf8 -*-
+from rest_framework import status
+from rest_framework.response import Response
+from hashlib import md5
+import json
+
+
+def make_etag(*parts):
+    """
+    根据验证数据生成ETag
+    """
+    source = u'|'.join(u'%s' % item for item in parts)
+    return '"%s"' % md5(source.encode('utf8')).hexdigest()
+
+
+def make_data_etag(data, *parts):
+    """
+    根据返回数据内容生成ETag
+    """
+    from horizon.main import DatetimeEncode
+
+    source = json.dumps(data, sort_keys=True, cls=DatetimeEncode)
+    return make_etag(source, *parts)
+
+
+def is_not_modified(request, etag):
+    """
+    判断客户端缓存的数据是否仍然有效（请求头：If-None-Match）
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = [item.strip() for item in if_none_match.split(',')]
+    return etag in etags or '*' in etags
+
+
+def not_modified_response(etag):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    return response
+
+
+def conditional_response(request, etag, data, status_code=status.HTTP_200_OK):
+    """
+    ETag与客户端一致时返回304，否则返回数据并带上ETag
+    """
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    response = Response(data, status=status_code)
+    response['ETag'] = etag
+    return response
@@ -1,7 +1,13 @@
 #-*- coding:utf8 -*-
 import requests
 import urllib
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 from rest_framework.views import View
+from collections import deque
+import os
+import threading
+import time
 
 
 def send_http_request(access_url, access_params, method='get',
@@ -26,4 +32,95 @@ def send_http_request(access_url, access_params, method='get',
         results = handle(request_url, headers=headers)
     except Exception as e:
         return e
-    return results
\ No newline at end of file
+    return results
+
+
+class HttpRequestStats(object):
+    """
+    请求耗时统计（进程内）：请求次数、失败次数、平均耗时、最大耗时及最近请求的耗时分位数
+    """
+    def __init__(self, recent_size=500):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent_size)
+        self._count = 0
+        self._errors = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self._count += 1
+            if error:
+                self._errors += 1
+            self._total_seconds += seconds
+            self._max_seconds = max(self._max_seconds, seconds)
+            self._recent.append(seconds)
+
+    def stats(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            count = self._count
+
+            def percentile(percent):
+                if not recent:
+                    return 0.0
+                return recent[min(len(recent) - 1, int(len(recent) * percent))] * 1000
+
+            return {'count': count,
+                    'errors': self._errors,
+                    'avg_ms': self._total_seconds / count * 1000 if count else 0.0,
+                    'max_ms': self._max_seconds * 1000,
+                    'p50_ms': percentile(0.5),
+                    'p95_ms': percentile(0.95)}
+
+
+class HttpClient(object):
+    """
+    带连接池的http客户端（keep-alive复用连接，每个进程一个Session），
+    所有请求都有超时时间，连接失败时自动重试，并统计请求耗时
+    timeout: (连接超时, 读取超时)，单位：秒
+    retries: 建立连接失败时的重试次数（请求已发出后不重试，避免重复提交）
+    """
+    def __init__(self, timeout=(3, 10), retries=2, pool_maxsize=10):
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_maxsize = pool_maxsize
+        self.request_stats = HttpRequestStats()
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # fork出的子进程不能复用父进程的连接
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=self.pool_maxsize,
+                                      max_retries=Retry(total=self.retries,
+                                                        connect=self.retries,
+                                                        read=0,
+                                                        backoff_factor=0.1))
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.time()
+        try:
+            results = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.request_stats.record(time.time() - start, error=True)
+            raise
+        self.request_stats.record(time.time() - start, error=results.status_code >= 400)
+        return results
+
+    def post(self, url, **kwargs):
+        return self.request('post', url, **kwargs)
+
+    def stats(self):
+        return self.request_stats.stats()
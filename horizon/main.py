@@ -9,7 +9,8 @@ import qrcode
 import json
 import os
 import uuid
-from hashlib import md5
+from hashlib import md5, sha256
+import hmac
 import base64
 import random
 import time
@@ -71,6 +72,16 @@ def timezoneStringTostring(timezone_string):
     return str(timezone)
 
 
+def datetimeTostring(value):
+    """
+    直接将datetime.datetime格式化为："2017-05-19 09:40:37"，
+    结果与timezoneStringTostring处理rest framework输出的时间字符串一致（不做字符串解析），
+    返回类型：string
+    """
+    return '%04d-%02d-%02d %02d:%02d:%02d' % (value.year, value.month, value.day,
+                                              value.hour, value.minute, value.second)
+
+
 def make_qrcode(source_data, version=5):
     """
     生成二维码图片
@@ -130,24 +141,52 @@ def make_dict_to_xml(source_dict, use_cdata=True):
     return xml_string.split('\n', 1)[1]
 
 
-def make_sign_for_wxpay(source_dict):
+def make_canonical_string(params_dict, encoding=None):
     """
-    生成签名（微信支付）
+    将参数字典转换成待签名的字符串（参数名按ASCII码从小到大排序，空值及sign不参与签名）：
+    key1=value1&key2=value2...
+    encoding: 参数值的编码方式（为None时不编码）
     """
-    key_list = []
-    for _key in source_dict:
-        if not source_dict[_key] or _key == 'sign':
+    items = []
+    for key in sorted(params_dict):
+        value = params_dict[key]
+        if not value or key == 'sign':
             continue
-        key_list.append({'key': _key, 'value': source_dict[_key]})
-    key_list.sort(key=lambda x: x['key'])
+        if encoding:
+            value = value.encode(encoding)
+        items.append('%s=%s' % (key, value))
+    return '&'.join(items)
 
-    string_param = ''
-    for item in key_list:
-        string_param += '%s=%s&' % (item['key'], item['value'])
-        # 把密钥和其它参数组合起来
-    string_param += 'key=%s' % wx_settings.KEY
-    md5_string = md5(string_param.encode('utf8')).hexdigest()
-    return md5_string.upper()
+
+def make_sign_for_wxpay(source_dict, sign_type=None):
+    """
+    生成签名（微信支付）
+    签名类型：MD5 或 HMAC-SHA256，默认为wx_settings.SIGN_TYPE
+    """
+    sign_type = sign_type or wx_settings.SIGN_TYPE
+    string_param = make_canonical_string(source_dict)
+    # 把密钥和其它参数组合起来
+    if string_param:
+        string_param = '%s&key=%s' % (string_param, wx_settings.KEY)
+    else:
+        string_param = 'key=%s' % wx_settings.KEY
+    if sign_type == 'HMAC-SHA256':
+        sign = hmac.new(wx_settings.KEY.encode('utf8'), string_param.encode('utf8'), sha256)
+    elif sign_type == 'MD5':
+        sign = md5(string_param.encode('utf8'))
+    else:
+        raise ValueError('Sign type %s is not supported' % sign_type)
+    return sign.hexdigest().upper()
+
+
+def verify_sign_for_wxpay(source_dict, sign, sign_type=None):
+    """
+    验证签名（微信支付），source_dict中的sign字段不参与签名
+    """
+    if not sign:
+        return False
+    maked_sign = make_sign_for_wxpay(source_dict, sign_type)
+    return hmac.compare_digest(str(maked_sign), str(sign))
 
 
 # def verify_sign_for_alipay(params_str, source_sign):
@@ -165,16 +204,7 @@ def make_dict_to_verify_string(params_dict):
     """
     将参数字典转换成待签名的字符串
     """
-    params_list = []
-    for key, value in params_dict.items():
-        if not value or key == 'sign':
-            continue
-        params_list.append({'key': key, 'value': value})
-    params_list.sort(key=lambda x: x['key'])
-    params_strs = []
-    for item in params_list:
-        params_strs.append('%s=%s' % (item['key'], (item['value']).encode('utf8')))
-    return '&'.join(params_strs)
+    return make_canonical_string(params_dict, encoding='utf8')
 
 
 def make_random_number_of_string(str_length=6):
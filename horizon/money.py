@@ -0,0 +1,107 @@
+# -*- coding:utf8 -*-
+from django.db import models
+from django.db.models import F, Func, Q
+from django.db.models.functions import Cast
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def to_cents(amount):
+    """
+    金额（字符串或Decimal，单位：元）转换为整数金额（单位：分）
+    """
+    cents = Decimal(str(amount)) * 100
+    return int(cents.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def cents_to_string(cents):
+    """
+    整数金额（单位：分）转换为金额字符串（单位：元），如：1250 -> "12.50"
+    """
+    return str((Decimal(cents) / 100).quantize(Decimal('0.01')))
+
+
+def cents_field_name(field_name):
+    return '%s_cents' % field_name
+
+
+def money_cents_expression(field_name):
+    """
+    数据库端由金额字符串字段（单位：元）计算整数金额（单位：分）
+    """
+    return Func(Cast(F(field_name), models.DecimalField(max_digits=16, decimal_places=2)) * 100,
+                function='ROUND',
+                output_field=models.BigIntegerField())
+
+
+def cents_string_expression(expression):
+    """
+    数据库端由整数金额（单位：分）计算金额字符串（单位：元，两位小数），如：1250 -> "12.50"
+    """
+    return Cast(Func(expression,
+                     template='CAST(%(expressions)s / 100 AS DECIMAL(16, 2))',
+                     output_field=models.DecimalField(max_digits=16, decimal_places=2)),
+                models.CharField())
+
+
+class MoneyCentsMixin(object):
+    """
+    金额字段由字符串（单位：元）迁移到整数（单位：分）的过渡期：
+      写：save()时由字符串字段计算对应的整数字段（xxx_cents）一并写入，
+          数据库端更新（如：余额增减）须在同一条UPDATE语句中同时更新两个字段
+      读：优先读取整数字段，整数字段为空（尚未补齐的历史数据）时由字符串字段计算
+    历史数据用backfill_money_cents在数据库端批量补齐，金额统计用money_cents_expression兼容未补齐的数据
+    """
+    # 金额字段（字符串），对应的整数字段名为：字段名 + '_cents'
+    money_fields = ()
+
+    def sync_money_cents(self):
+        """
+        由字符串字段计算整数字段
+        """
+        for field_name in self.money_fields:
+            amount = getattr(self, field_name)
+            if amount in (None, ''):
+                setattr(self, cents_field_name(field_name), None)
+            else:
+                setattr(self, cents_field_name(field_name), to_cents(amount))
+
+    def save(self, *args, **kwargs):
+        self.sync_money_cents()
+        return super(MoneyCentsMixin, self).save(*args, **kwargs)
+
+    def get_money_cents(self, field_name):
+        """
+        读取整数金额（单位：分，整数字段为空时由字符串字段计算）
+        """
+        cents = getattr(self, cents_field_name(field_name))
+        if cents is not None:
+            return cents
+        return to_cents(getattr(self, field_name) or 0)
+
+    @classmethod
+    def backfill_money_cents(cls, batch_size=1000, **kwargs):
+        """
+        补齐历史数据的整数金额字段（数据库端计算，每批最多更新batch_size条），返回更新的数据量
+        """
+        if not cls.money_fields:
+            return 0
+        updated_values = {cents_field_name(field_name): money_cents_expression(field_name)
+                          for field_name in cls.money_fields}
+        null_filter = Q()
+        for field_name in cls.money_fields:
+            null_filter |= Q(**{'%s__isnull' % cents_field_name(field_name): True})
+
+        # 按主键顺序向后推进，无法转换的数据（更新后仍为空）不会被重复选中
+        updated_count, last_pk = 0, None
+        while True:
+            queryset = cls._base_manager.filter(**kwargs).filter(null_filter)
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            updated_count += cls._base_manager.filter(null_filter, pk__in=pks).update(**updated_values)
+            last_pk = pks[-1]
+            if len(pks) < batch_size:
+                break
+        return updated_count
@@ -1,2 +1,2 @@
 from redis import *
-from .client import Redis
\ No newline at end of file
+from .client import Redis, get_redis_connection
\ No newline at end of file
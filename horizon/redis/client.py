@@ -1,6 +1,25 @@
 #-*- coding:utf8 -*-
 import redis
 import pickle
+from django.conf import settings
+
+
+_connection_pools = {}
+
+
+def get_redis_connection(db_name='consumer'):
+    """
+    获取缓存服务器连接（同一进程内按db共用连接池）
+    db_name: settings.REDIS_SETTINGS['db_set']中的名称
+             （settings.REDIS_SETTINGS['servers']中配置了该名称时，连接单独的缓存服务器）
+    """
+    if db_name not in _connection_pools:
+        server = settings.REDIS_SETTINGS.get('servers', {}).get(db_name, {})
+        _connection_pools[db_name] = redis.ConnectionPool(
+            host=server.get('host', settings.REDIS_SETTINGS['host']),
+            port=server.get('port', settings.REDIS_SETTINGS['port']),
+            db=settings.REDIS_SETTINGS['db_set'][db_name])
+    return Redis(connection_pool=_connection_pools[db_name])
 
 
 class Redis(redis.Redis):
@@ -1,16 +1,28 @@
 #-*- coding:utf8 -*-
 from rest_framework import serializers
 from rest_framework import fields as Fields
-from django.core.paginator import Paginator
+from django.core.paginator import Paginator, EmptyPage
 from django.conf import settings
 from django.db import models
-from horizon.main import timezoneStringTostring
-from horizon.models import model_to_dict
+from django.db.models import Q, QuerySet
+from django.utils import six
+from horizon.main import timezoneStringTostring, datetimeTostring, DatetimeEncode
+from horizon.caches import LocalCache
 import os
-import datetime
+import base64
+import json
+
+
+# 分页时总数据量（COUNT查询结果）的进程内缓存，按SQL语句缓存
+count_cache = LocalCache(maxsize=1000, timeout=60)
 
 
 class BaseListSerializer(serializers.ListSerializer):
+    # 游标分页时的排序字段（该字段须有索引），'-'开头表示倒序
+    cursor_ordering = '-id'
+    # 按页码分页时，总数据量的缓存时间（单位：秒），None表示不缓存
+    count_cache_timeout = None
+
     def list_data(self, page_size=settings.PAGE_SIZE, page_index=1, **kwargs):
         """
         函数功能：分页
@@ -22,45 +34,102 @@ class BaseListSerializer(serializers.ListSerializer):
                                 },...]
                        }
         """
-        # page size不能超过默认最大值，如果超过，则按page size默认最大值返回数据
+        if kwargs.get('paging_mode') == 'cursor':
+            return self.cursor_list_data(page_size, **kwargs)
+        # 数据为queryset时，在数据库端分页，只序列化当前页的数据
+        if isinstance(self.instance, QuerySet):
+            page = paginate_queryset(self.instance, page_size, page_index,
+                                     count_cache_timeout=self.count_cache_timeout)
+            if isinstance(page, Exception):
+                return page
+            instances, all_count, has_next = page
+            return make_page_results(self.__class__(instances).perfect_result(),
+                                     all_count, has_next)
+        serializer = self.perfect_result()
+        return paginate_list_data(serializer, page_size, page_index)
+
+    def get_page_queryset(self, queryset):
+        """
+        查询当前页数据使用的queryset（子类可附加只有输出时才需要的annotate等，
+        不影响总数据量的COUNT查询）
+        """
+        return queryset
+
+    def cursor_list_data(self, page_size=settings.PAGE_SIZE, cursor=None, with_count=False, **kwargs):
+        """
+        函数功能：游标分页（按cursor_ordering字段定位，每次只查询page_size + 1条数据）
+        返回数据格式为：{'count': 当前返回的数据量,
+                       'all_count': 总数据量（with_count为True时才返回）,
+                       'has_next': 是否有下一页,
+                       'next_cursor': 下一页的游标（没有下一页时为None）,
+                       'data': [{
+                                  model数据
+                                },...]
+                       }
+        """
         if page_size > settings.MAX_PAGE_SIZE:
             page_size = settings.MAX_PAGE_SIZE
-        serializer = self.perfect_result()
-        paginator = Paginator(serializer, page_size)
-        try:
-            page = paginator.page(page_index)
-        except Exception as e:
-            return e
-
-        has_next = True
-        if len(page.object_list) < page_size:
-            has_next = False
-        elif page_size * page_index >= len(serializer):
-            has_next = False
-        results = {'count': len(page.object_list),
-                   'all_count': len(serializer),
+        queryset = self.instance
+        if not isinstance(queryset, QuerySet):
+            return TypeError('Cursor paging requires a queryset')
+
+        field_name = self.cursor_ordering.lstrip('-')
+        if self.cursor_ordering.startswith('-'):
+            lookup, pk_ordering = 'lt', '-pk'
+        else:
+            lookup, pk_ordering = 'gt', 'pk'
+        page_queryset = self.get_page_queryset(queryset).order_by(self.cursor_ordering, pk_ordering)
+        if cursor:
+            try:
+                value, pk = decode_cursor(cursor)
+            except Exception as e:
+                return e
+            page_queryset = page_queryset.filter(
+                Q(**{'%s__%s' % (field_name, lookup): value}) |
+                Q(**{field_name: value, 'pk__%s' % lookup: pk}))
+
+        instances = list(page_queryset[:page_size + 1])
+        has_next = len(instances) > page_size
+        instances = instances[:page_size]
+        next_cursor = None
+        if has_next:
+            next_cursor = encode_cursor(getattr(instances[-1], field_name), instances[-1].pk)
+
+        results = {'count': len(instances),
                    'has_next': has_next,
-                   'data': page.object_list}
+                   'next_cursor': next_cursor,
+                   'data': self.__class__(instances).perfect_result()}
+        if with_count:
+            results['all_count'] = queryset.count()
         return results
 
     def perfect_result(self):
-        dict_format = {}
-        if hasattr(self, 'initial_data'):
-            if len(self.initial_data) > 0:
-                dict_format = self.initial_data[0]
-        else:
-            if len(self.instance) > 0:
-                dict_format = model_to_dict(self.instance[0])
+        datetime_keys, formatted_keys, image_keys = get_field_plan(self.child)
         ordered_dict = self.data
         for item in ordered_dict:
-            for key in item.keys():
-                if isinstance(dict_format[key], datetime.datetime):
-                    item[key] = timezoneStringTostring(item[key])
-                if isinstance(dict_format[key], models.fields.files.ImageFieldFile):
+            for key in datetime_keys:
+                value = item.get(key)
+                if value is not None:
+                    item[key] = timezoneStringTostring(value)
+            for key in image_keys:
+                if key in item:
                     item['%s_url' % key] = os.path.join(settings.WEB_URL_FIX, item[key])
         return ordered_dict
 
 
+class DateTimeField(Fields.DateTimeField):
+    """
+    输出时直接生成"2017-05-19 09:40:37"格式的时间字符串，
+    无需再经过timezoneStringTostring解析、格式化
+    """
+    def to_representation(self, value):
+        if not value:
+            return None
+        if isinstance(value, six.string_types):
+            return timezoneStringTostring(value)
+        return datetimeTostring(value)
+
+
 class BaseSerializer(serializers.Serializer):
     @property
     def data(self):
@@ -69,6 +138,9 @@ class BaseSerializer(serializers.Serializer):
 
 
 class BaseModelSerializer(serializers.ModelSerializer):
+    serializer_field_mapping = dict(serializers.ModelSerializer.serializer_field_mapping)
+    serializer_field_mapping[models.DateTimeField] = DateTimeField
+
     @property
     def data(self):
         _data = super(BaseModelSerializer, self).data
@@ -76,10 +148,108 @@ class BaseModelSerializer(serializers.ModelSerializer):
 
 
 def perfect_result(self, _data):
-    _fields = self.get_fields()
-    for key in _data:
-        if isinstance(_fields[key], Fields.DateTimeField):
+    datetime_keys, formatted_keys, image_keys = get_field_plan(self)
+    for key in datetime_keys:
+        if key in _data:
             _data[key] = timezoneStringTostring(_data[key])
-        if isinstance(_fields[key], Fields.ImageField):
+    for key in formatted_keys:
+        if _data.get(key, '') is None:
+            _data[key] = ''
+    for key in image_keys:
+        if key in _data:
             _data['%s_url' % key] = os.path.join(settings.WEB_URL_FIX, _data[key])
     return _data
+
+
+# 各序列化类需要后处理的字段（按序列化类缓存）：
+# {serializer class: (时间字段, 已格式化的时间字段, 图片字段)}
+_field_plans = {}
+
+
+def get_field_plan(serializer):
+    """
+    获取序列化类中的时间字段和图片字段（每个序列化类只计算一次）
+    """
+    plan = _field_plans.get(serializer.__class__)
+    if plan is None:
+        fields = serializer.fields
+        datetime_keys = tuple(key for key, field in fields.items()
+                              if isinstance(field, Fields.DateTimeField) and
+                              not isinstance(field, DateTimeField))
+        formatted_keys = tuple(key for key, field in fields.items()
+                               if isinstance(field, DateTimeField))
+        image_keys = tuple(key for key, field in fields.items()
+                           if isinstance(field, Fields.ImageField))
+        plan = (datetime_keys, formatted_keys, image_keys)
+        _field_plans[serializer.__class__] = plan
+    return plan
+
+
+def paginate_list_data(serializer, page_size=settings.PAGE_SIZE, page_index=1, **kwargs):
+    """
+    对已序列化的数据列表分页，返回数据格式同BaseListSerializer.list_data
+    """
+    # page size不能超过默认最大值，如果超过，则按page size默认最大值返回数据
+    if page_size > settings.MAX_PAGE_SIZE:
+        page_size = settings.MAX_PAGE_SIZE
+    paginator = Paginator(serializer, page_size)
+    try:
+        page = paginator.page(page_index)
+    except Exception as e:
+        return e
+
+    has_next = True
+    if len(page.object_list) < page_size:
+        has_next = False
+    elif page_size * page_index >= len(serializer):
+        has_next = False
+    return make_page_results(page.object_list, len(serializer), has_next)
+
+
+def paginate_queryset(queryset, page_size=settings.PAGE_SIZE, page_index=1,
+                      count_cache_timeout=None, **kwargs):
+    """
+    数据库端分页（COUNT查询 + LIMIT/OFFSET）
+    返回数据格式为：(当前页的数据列表, 总数据量, 是否有下一页)
+    """
+    if page_size > settings.MAX_PAGE_SIZE:
+        page_size = settings.MAX_PAGE_SIZE
+    all_count = get_queryset_count(queryset, count_cache_timeout)
+    offset = page_size * (page_index - 1)
+    # 与Paginator一致：第一页总是有效的，其他页超出范围时返回错误
+    if page_index < 1 or (page_index > 1 and offset >= all_count):
+        return EmptyPage('That page contains no results')
+    instances = list(queryset[offset:offset + page_size])
+    return instances, all_count, page_size * page_index < all_count
+
+
+def get_queryset_count(queryset, cache_timeout=None):
+    if not cache_timeout:
+        return queryset.count()
+    try:
+        cache_key = '%s:%s' % (queryset.db, queryset.query)
+    except Exception:
+        return queryset.count()
+    all_count = count_cache.get(cache_key)
+    if all_count is None:
+        all_count = queryset.count()
+        count_cache.set(cache_key, all_count, timeout=cache_timeout)
+    return all_count
+
+
+def make_page_results(data, all_count, has_next):
+    return {'count': len(data),
+            'all_count': all_count,
+            'has_next': has_next,
+            'data': data}
+
+
+def encode_cursor(value, pk):
+    """
+    生成游标（排序字段的值及主键，base64编码）
+    """
+    return base64.urlsafe_b64encode(json.dumps([value, pk], cls=DatetimeEncode))
+
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(str(cursor)))
@@ -0,0 +1,91 @@
+# -*- coding:utf8 -*-
+from django.db import close_old_connections
+import os
+import threading
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class WorkerPoolFull(Exception):
+    """
+    线程池中等待执行的任务已满
+    """
+
+
+class WorkerTask(object):
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self._event = threading.Event()
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self.result = e
+        finally:
+            self._event.set()
+
+    @property
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """
+        等待任务完成，返回：任务是否已完成
+        """
+        self._event.wait(timeout)
+        return self.done
+
+
+class BoundedWorkerPool(object):
+    """
+    有界线程池（每个进程一个，首次提交任务时启动线程）：
+      最多max_workers个任务同时执行，最多max_pending个任务排队，
+      队列已满时立即返回WorkerPoolFull，不阻塞调用方
+    任务在线程中使用数据库时，每个任务结束后按CONN_MAX_AGE回收数据库连接
+    """
+    def __init__(self, max_workers=4, max_pending=20):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # fork出的子进程没有父进程的线程，需重新启动
+        with self._lock:
+            if self._queue is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            self._pid = os.getpid()
+            for _ in range(self.max_workers):
+                thread = threading.Thread(target=self._work, args=(self._queue,))
+                thread.daemon = True
+                thread.start()
+
+    def _work(self, task_queue):
+        while True:
+            task = task_queue.get()
+            try:
+                task.run()
+            finally:
+                close_old_connections()
+                task_queue.task_done()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        提交任务，返回：WorkerTask实例，队列已满时返回WorkerPoolFull实例
+        """
+        self._start()
+        task = WorkerTask(func, args, kwargs)
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            return WorkerPoolFull('Worker pool is busy, please try again later')
+        return task
@@ -0,0 +1,91 @@
+# -*- coding:utf8 -*-
+from Business_App.bz_dishes.models import Dishes
+from Business_App.bz_dishes.caches import FOOD_COURT_VERSION_KEY
+from hot_sale.serializers import HotSaleSerializer
+from horizon import redis
+from horizon.etags import make_data_etag
+import json
+import zlib
+
+
+# 热销菜品快照key（按美食城ID）
+HOT_SALE_SNAPSHOT_KEY = 'hot_sale_snapshot:%s'
+
+# 快照过期时间（单位：秒），商户端修改菜品后未使美食城版本号失效时，快照最多延迟这么久
+HOT_SALE_SNAPSHOT_TIMEOUT = 60 * 2
+
+
+class HotSaleSnapshot(object):
+    """
+    热销菜品快照（已序列化的热销菜品列表，zlib压缩后的json存储在consumer缓存数据库中）
+    快照记录生成时美食城的版本号，美食城版本号变化（expire_dishes）后快照自动失效
+    """
+    def __init__(self):
+        self.handle = redis.get_redis_connection('consumer')
+
+    def get_food_court_version(self, food_court_id):
+        return int(self.handle.get(FOOD_COURT_VERSION_KEY % food_court_id) or 0)
+
+    def make_snapshot_data(self, food_court_id):
+        """
+        从数据库生成热销菜品列表（已序列化）
+        """
+        object_data = Dishes.get_hot_sale_list(None, food_court_id=food_court_id)
+        if isinstance(object_data, Exception):
+            return object_data
+        serializer = HotSaleSerializer(data=object_data)
+        if not serializer.is_valid():
+            return Exception(serializer.errors)
+        return serializer.perfect_result()
+
+    def make_snapshot(self, food_court_id, version=0):
+        data = self.make_snapshot_data(food_court_id)
+        if isinstance(data, Exception):
+            return data
+        return {'version': version,
+                'etag': make_data_etag(data),
+                'data': data}
+
+    def rebuild_snapshot(self, food_court_id):
+        snapshot = self.make_snapshot(food_court_id, self.get_food_court_version(food_court_id))
+        if isinstance(snapshot, Exception):
+            return snapshot
+        self.handle.set(HOT_SALE_SNAPSHOT_KEY % food_court_id,
+                        zlib.compress(json.dumps(snapshot, separators=(',', ':'))),
+                        ex=HOT_SALE_SNAPSHOT_TIMEOUT)
+        return snapshot
+
+    def rebuild(self, food_court_id):
+        snapshot = self.rebuild_snapshot(food_court_id)
+        if isinstance(snapshot, Exception):
+            return snapshot
+        return snapshot['data']
+
+    def get_snapshot(self, food_court_id):
+        """
+        获取热销菜品快照，快照不存在或已失效时重新生成
+        返回数据格式：{'version': 美食城版本号, 'etag': 快照数据的ETag, 'data': 热销菜品列表}
+        """
+        if not food_court_id:
+            return ValueError('Food court ID must not be empty')
+        try:
+            pipe = self.handle.pipeline(transaction=False)
+            pipe.get(HOT_SALE_SNAPSHOT_KEY % food_court_id)
+            pipe.get(FOOD_COURT_VERSION_KEY % food_court_id)
+            value, version = pipe.execute()
+            if value is not None:
+                snapshot = json.loads(zlib.decompress(value))
+                if snapshot['version'] == int(version or 0):
+                    return snapshot
+            return self.rebuild_snapshot(food_court_id)
+        except redis.RedisError:
+            return self.make_snapshot(food_court_id)
+
+    def get(self, food_court_id):
+        snapshot = self.get_snapshot(food_court_id)
+        if isinstance(snapshot, Exception):
+            return snapshot
+        return snapshot['data']
+
+    def delete(self, food_court_id):
+        self.handle.delete(HOT_SALE_SNAPSHOT_KEY % food_court_id)
@@ -4,7 +4,10 @@ from django.conf import settings
 
 class HotSaleListForm(forms.Form):
     #is_recommend = forms.IntegerField(required=False)
-    food_court_id = forms.IntegerField(required=False)
+    food_court_id = forms.IntegerField(min_value=1,
+                                       error_messages={
+                                           'required': u'美食城ID不能为空'
+                                       })
     page_size = forms.IntegerField(min_value=1, max_value=settings.MAX_PAGE_SIZE, required=False)
     page_index = forms.IntegerField(min_value=1, required=False)
 class DishesGetForm(forms.Form):
@@ -21,4 +24,21 @@ class FoodCourtListForm(forms.Form):
     district = forms.CharField(min_length=2, max_length=100, required=False)
     mall = forms.CharField(min_length=2, max_length=200, required=False)
     page_size = forms.IntegerField(min_value=1, max_value=settings.MAX_PAGE_SIZE, required=False)
-    page_index = forms.IntegerField(min_value=1, required=False)
\ No newline at end of file
+    page_index = forms.IntegerField(min_value=1, required=False)
+    # 分页方式 page：按页码分页（默认） cursor：游标分页
+    paging_mode = forms.ChoiceField(choices=(('page', 'page'), ('cursor', 'cursor')), required=False)
+    cursor = forms.CharField(max_length=256, required=False)
+    with_count = forms.BooleanField(required=False)
+
+
+class DishesSearchForm(forms.Form):
+    food_court_id = forms.IntegerField(min_value=1,
+                                       error_messages={
+                                           'required': u'美食城ID不能为空'
+                                       })
+    keywords = forms.CharField(max_length=64,
+                               error_messages={
+                                   'required': u'搜索关键词不能为空'
+                               })
+    page_size = forms.IntegerField(min_value=1, max_value=settings.MAX_PAGE_SIZE, required=False)
+    page_index = forms.IntegerField(min_value=1, required=False)
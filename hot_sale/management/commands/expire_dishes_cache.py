@@ -0,0 +1,15 @@
+# -*- coding:utf8 -*-
+from django.core.management.base import BaseCommand
+from Business_App.bz_dishes.caches import expire_dishes
+
+
+class Command(BaseCommand):
+    help = u'商户端修改菜品后使菜品详情缓存及热销菜品快照失效（如：manage.py expire_dishes_cache 1 --dishes-id 12）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('food_court_id', type=int)
+        parser.add_argument('--dishes-id', dest='dishes_ids', type=int, action='append', default=[])
+
+    def handle(self, *args, **options):
+        version = expire_dishes(options['food_court_id'], *options['dishes_ids'])
+        self.stdout.write('food court %s: version %s' % (options['food_court_id'], version))
@@ -0,0 +1,27 @@
+# -*- coding:utf8 -*-
+from django.core.management.base import BaseCommand
+# 导入模型时注册商户、美食城信息缓存（local_caches）
+from Business_App.bz_users import models as bz_users_models
+from horizon.caches import local_caches, get_local_cache_stats
+
+
+class Command(BaseCommand):
+    help = u'查看各进程上报的进程内缓存统计（商户、美食城信息缓存）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*')
+
+    def handle(self, *args, **options):
+        names = options['names'] or sorted(local_caches)
+        for name in names:
+            workers = get_local_cache_stats(name)
+            hits = sum(stats['hits'] for stats in workers.values())
+            misses = sum(stats['misses'] for stats in workers.values())
+            self.stdout.write('%s: %s workers, hits %s, misses %s, hit rate %.2f%%' % (
+                name, len(workers), hits, misses,
+                100.0 * hits / (hits + misses) if hits + misses else 0.0))
+            for worker in sorted(workers):
+                stats = workers[worker]
+                self.stdout.write('  %s: size %s/%s, hits %s, misses %s, evictions %s, expirations %s' % (
+                    worker, stats['size'], stats['maxsize'], stats['hits'], stats['misses'],
+                    stats['evictions'], stats['expirations']))
@@ -0,0 +1,24 @@
+# -*- coding:utf8 -*-
+from django.core.management.base import BaseCommand
+from Business_App.bz_users.models import FoodCourt
+from hot_sale.caches import HotSaleSnapshot
+
+
+class Command(BaseCommand):
+    help = u'重新生成热销菜品快照（不指定美食城ID时，重新生成所有美食城的快照）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('food_court_ids', nargs='*', type=int)
+
+    def handle(self, *args, **options):
+        food_court_ids = options['food_court_ids']
+        if not food_court_ids:
+            food_court_ids = FoodCourt.objects.values_list('pk', flat=True)
+
+        snapshot = HotSaleSnapshot()
+        for food_court_id in food_court_ids:
+            result = snapshot.rebuild(food_court_id)
+            if isinstance(result, Exception):
+                self.stderr.write('food court %s: %s' % (food_court_id, result.args))
+            else:
+                self.stdout.write('food court %s: %s dishes' % (food_court_id, len(result)))
@@ -0,0 +1,137 @@
+# -*- coding:utf8 -*-
+from __future__ import unicode_literals
+
+from Business_App.bz_dishes.models import Dishes
+import bisect
+import re
+import threading
+import time
+
+
+# 索引增量更新的最小间隔（单位：秒）
+SEARCH_INDEX_REFRESH_INTERVAL = 30
+
+CJK_RE = re.compile('[\u4e00-\u9fff]+')
+WORD_RE = re.compile('[a-z0-9]+')
+
+
+def tokenize(text, for_query=False):
+    """
+    分词（不依赖外部服务）：
+      中文按单字及相邻两字（bigram）切分，查询时连续两个字以上的中文只用bigram
+      英文及数字按单词切分，查询时按前缀匹配
+    返回数据格式：(中文词集合, 英文及数字单词集合)
+    """
+    cjk_tokens = set()
+    for run in CJK_RE.findall(text or ''):
+        bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if not for_query or not bigrams:
+            cjk_tokens.update(run)
+        cjk_tokens.update(bigrams)
+    word_tokens = set(WORD_RE.findall((text or '').lower()))
+    return cjk_tokens, word_tokens
+
+
+class DishesSearchIndex(object):
+    """
+    单个美食城的菜品倒排索引（菜品标题及副标题），按菜品的updated时间增量更新
+    """
+    def __init__(self, food_court_id):
+        self.food_court_id = food_court_id
+        self._postings = {}          # {token: set(dishes_id)}
+        self._dishes_tokens = {}     # {dishes_id: (tokens, title tokens)}
+        self._sorted_words = []      # 英文及数字单词（有序，用于前缀匹配）
+        self._words_dirty = False
+        self._updated = None
+        self._refreshed = 0
+        self._lock = threading.Lock()
+
+    def _add(self, dishes_id, title, subtitle):
+        title_tokens = set().union(*tokenize(title))
+        tokens = title_tokens.union(*tokenize(subtitle))
+        for token in tokens:
+            if token not in self._postings:
+                self._postings[token] = set()
+                self._words_dirty = True
+            self._postings[token].add(dishes_id)
+        self._dishes_tokens[dishes_id] = (tokens, title_tokens)
+
+    def _remove(self, dishes_id):
+        tokens, _ = self._dishes_tokens.pop(dishes_id, (set(), set()))
+        for token in tokens:
+            postings = self._postings[token]
+            postings.discard(dishes_id)
+            if not postings:
+                del self._postings[token]
+                self._words_dirty = True
+
+    def refresh(self, force=False):
+        """
+        从数据库增量更新索引（只读取updated不早于上次更新时间的菜品，包括已删除的菜品）
+        """
+        with self._lock:
+            if not force and time.time() - self._refreshed < SEARCH_INDEX_REFRESH_INTERVAL:
+                return
+            queryset = Dishes._base_manager.filter(food_court_id=self.food_court_id)
+            if self._updated is not None:
+                queryset = queryset.filter(updated__gte=self._updated)
+            for item in queryset.values('id', 'title', 'subtitle', 'status', 'updated'):
+                self._remove(item['id'])
+                if item['status'] == 1:
+                    self._add(item['id'], item['title'], item['subtitle'])
+                if self._updated is None or item['updated'] > self._updated:
+                    self._updated = item['updated']
+            self._refreshed = time.time()
+
+    def _match_word_prefix(self, word):
+        if self._words_dirty:
+            self._sorted_words = sorted(token for token in self._postings
+                                        if WORD_RE.match(token))
+            self._words_dirty = False
+        matched = set()
+        index = bisect.bisect_left(self._sorted_words, word)
+        while index < len(self._sorted_words) and self._sorted_words[index].startswith(word):
+            matched.update(self._postings[self._sorted_words[index]])
+            index += 1
+        return matched
+
+    def search(self, keywords):
+        """
+        搜索菜品，返回匹配所有关键词的菜品ID列表（标题匹配的菜品排在前面）
+        """
+        cjk_tokens, word_tokens = tokenize(keywords, for_query=True)
+        if not (cjk_tokens or word_tokens):
+            return []
+        with self._lock:
+            results = None
+            for token in cjk_tokens:
+                matched = self._postings.get(token, set())
+                results = matched.copy() if results is None else results & matched
+            for word in word_tokens:
+                matched = self._match_word_prefix(word)
+                results = matched if results is None else results & matched
+            query_tokens = cjk_tokens | word_tokens
+
+            def sort_key(dishes_id):
+                title_tokens = self._dishes_tokens[dishes_id][1]
+                in_title = all(token in title_tokens or
+                               any(item.startswith(token) for item in title_tokens)
+                               for token in query_tokens)
+                return (not in_title, dishes_id)
+            return sorted(results, key=sort_key)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(food_court_id):
+    """
+    获取美食城的菜品索引（每个进程每个美食城一个索引，首次使用时从数据库建立）
+    """
+    with _indexes_lock:
+        if food_court_id not in _indexes:
+            _indexes[food_court_id] = DishesSearchIndex(food_court_id)
+        index = _indexes[food_court_id]
+    index.refresh()
+    return index
@@ -54,5 +54,7 @@ class FoodCourtSerializer(serializers.ModelSerializer):
 
 class FoodCourtListSerializer(BaseListSerializer):
     child = FoodCourtSerializer()
+    cursor_ordering = 'id'
+    count_cache_timeout = 60 * 5
 
 
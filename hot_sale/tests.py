@@ -1,3 +1,156 @@
-from django.test import TestCase
+# -*- coding:utf8 -*-
+from django.test import SimpleTestCase
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework import fields as Fields
+from horizon import caches
+from horizon import redis
+from horizon.serializers import (BaseListSerializer, DateTimeField,
+                                 get_field_plan, timezoneStringTostring)
+import datetime
+import os
 
-# Create your tests here.
+
+class ImageValue(object):
+    """
+    模拟图片字段的值（ImageField序列化时只读取name属性）
+    """
+    def __init__(self, name):
+        self.name = name
+
+
+class BenchmarkSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    business_name = serializers.CharField()
+    price = serializers.CharField()
+    image = serializers.ImageField(use_url=False)
+    created = serializers.DateTimeField()
+    updated = serializers.DateTimeField()
+
+
+class BenchmarkListSerializer(BaseListSerializer):
+    child = BenchmarkSerializer()
+
+
+class LegacyBenchmarkListSerializer(BaseListSerializer):
+    """
+    字段计划之前的后处理方式：每个数据的每个字段都做类型判断
+    """
+    child = BenchmarkSerializer()
+
+    def perfect_result(self):
+        _fields = self.child.fields
+        ordered_dict = self.data
+        for item in ordered_dict:
+            for key in list(item.keys()):
+                if isinstance(_fields[key], Fields.DateTimeField):
+                    if item[key] is not None:
+                        item[key] = timezoneStringTostring(item[key])
+                if isinstance(_fields[key], Fields.ImageField):
+                    item['%s_url' % key] = os.path.join(settings.WEB_URL_FIX, item[key])
+        return ordered_dict
+
+
+def legacy_datetime_representation(value):
+    """
+    之前的时间格式化方式：rest framework输出ISO格式字符串，再由timezoneStringTostring解析、格式化
+    """
+    return timezoneStringTostring(Fields.DateTimeField().to_representation(value))
+
+
+def make_datetimes(count=1000):
+    start = datetime.datetime(2017, 1, 1)
+    values = [start + datetime.timedelta(seconds=index * 7919, microseconds=index * 104729 % 1000000)
+              for index in range(count)]
+    values.append(datetime.datetime(2017, 5, 19, 9, 40, 37))
+    values.append(datetime.datetime(2017, 5, 19, 9, 40, 37, 227692))
+    return values
+
+
+def make_instances(count=settings.MAX_PAGE_SIZE):
+    now = datetime.datetime(2017, 5, 19, 9, 40, 37)
+    return [{'id': index,
+             'title': u'菜品%s' % index,
+             'business_name': u'商户%s' % (index % 20),
+             'price': '%s.50' % index,
+             'image': ImageValue('dishes/%s.png' % index),
+             'created': now,
+             'updated': now}
+            for index in range(count)]
+
+
+class FieldPlanTestCase(SimpleTestCase):
+    def test_field_plan(self):
+        datetime_keys, formatted_keys, image_keys = get_field_plan(BenchmarkSerializer())
+        self.assertEqual(datetime_keys, ('created', 'updated'))
+        self.assertEqual(formatted_keys, ())
+        self.assertEqual(image_keys, ('image',))
+
+    def test_same_result_as_legacy(self):
+        instances = make_instances(3)
+        result = BenchmarkListSerializer(instances).perfect_result()
+        legacy_result = LegacyBenchmarkListSerializer(instances).perfect_result()
+        self.assertEqual([dict(item) for item in result],
+                         [dict(item) for item in legacy_result])
+        self.assertEqual(result[0]['created'], '2017-05-19 09:40:37')
+        self.assertEqual(result[0]['image_url'],
+                         os.path.join(settings.WEB_URL_FIX, 'dishes/0.png'))
+
+
+class DateTimeFieldTestCase(SimpleTestCase):
+    def test_same_result_as_legacy(self):
+        field = DateTimeField()
+        for value in make_datetimes():
+            self.assertEqual(field.to_representation(value), legacy_datetime_representation(value))
+        self.assertEqual(field.to_representation(datetime.datetime(2017, 5, 19, 9, 40, 37, 227692)),
+                         '2017-05-19 09:40:37')
+        self.assertEqual(field.to_representation('2017-05-19T09:40:37Z'), '2017-05-19 09:40:37')
+        self.assertIsNone(field.to_representation(None))
+
+
+class FakeStatsRedis(object):
+    """
+    缓存服务器替身（只实现统计上报用到的命令）
+    """
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = value
+
+    def expire(self, key, timeout):
+        pass
+
+    def execute(self):
+        pass
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+
+class LocalCacheStatsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.fake_redis = FakeStatsRedis()
+        self.origin_get_redis_connection = redis.get_redis_connection
+        redis.get_redis_connection = lambda db_name='consumer': self.fake_redis
+
+    def tearDown(self):
+        redis.get_redis_connection = self.origin_get_redis_connection
+        caches.local_caches.pop('test_cache', None)
+
+    def test_report_stats(self):
+        cache = caches.LocalCache(maxsize=2, name='test_cache')
+        cache.set(1, 'a')
+        self.assertEqual(cache.get(1), 'a')
+        workers = caches.get_local_cache_stats('test_cache')
+        self.assertEqual(len(workers), 1)
+        self.assertEqual(list(workers.values())[0]['hits'], 1)
+
+        # 上报间隔内不重复上报
+        cache.get(2)
+        self.assertEqual(list(caches.get_local_cache_stats('test_cache').values())[0]['misses'], 0)
+        self.assertIs(caches.local_caches['test_cache'], cache)
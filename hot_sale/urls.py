@@ -7,6 +7,7 @@ urlpatterns = [
     #url(r'hot_sale_action/$', orders_view.PayOrdersAction.as_view()),
     url(r'hot_sale_list/$', hot_sale_view.HotSaleList.as_view()),
     url(r'dishes_detail/$', hot_sale_view.DishesDetail.as_view()),
+    url(r'dishes_search/$', hot_sale_view.DishesSearch.as_view()),
     url(r'food_court_list/$', hot_sale_view.FoodCourtList.as_view()),
     url(r'food_court_detail/$', hot_sale_view.FoodCourtDetail.as_view()),
 
@@ -7,7 +7,14 @@ from django.utils.six import BytesIO
 from Business_App.bz_dishes.models import Dishes
 from Business_App.bz_users.models import FoodCourt
 from hot_sale.serializers import (HotSaleSerializer,DishesDetailSerializer,DishesSerializer,FoodCourtListSerializer,FoodCourtSerializer)
-from hot_sale.forms import (HotSaleListForm,DishesGetForm,FoodCourtListForm,FoodCourtGetForm,)
+from hot_sale.forms import (HotSaleListForm,DishesGetForm,FoodCourtListForm,FoodCourtGetForm,
+                            DishesSearchForm)
+from hot_sale.caches import HotSaleSnapshot
+from hot_sale.search import get_search_index
+from Business_App.bz_dishes.caches import DishesCache
+from horizon.serializers import paginate_list_data
+from horizon.etags import (make_etag, make_data_etag,
+                           is_not_modified, not_modified_response, conditional_response)
 from django.shortcuts import render
 
 # Create your views here.
@@ -16,8 +23,8 @@ class HotSaleList(generics.GenericAPIView):
     serializer_class = HotSaleSerializer
     # permissions = (IsOwnerOrReadOnly,)
 
-    def get_hot_sale_list(self, request, **kwargs):
-        return Dishes.get_hot_sale_list(request, **kwargs)
+    def get_hot_sale_snapshot(self, request, **kwargs):
+        return HotSaleSnapshot().get_snapshot(kwargs.get('food_court_id'))
 
     def post(self, request, *args, **kwargs):
         """
@@ -32,17 +39,18 @@ class HotSaleList(generics.GenericAPIView):
             return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
 
         cld = form.cleaned_data
-        object_data = self.get_hot_sale_list(request, **cld)
-        if isinstance(object_data, Exception):
-            return Response({'Error': object_data.args}, status=status.HTTP_400_BAD_REQUEST)
-
-        serializer = HotSaleSerializer(data = object_data)
-        if not serializer.is_valid():
-            return Response({'Error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
-        results = serializer.list_data(**cld)
+        snapshot = self.get_hot_sale_snapshot(request, **cld)
+        if isinstance(snapshot, Exception):
+            return Response({'Error': snapshot.args}, status=status.HTTP_400_BAD_REQUEST)
+        # 快照未变化时直接返回304
+        etag = make_etag(snapshot['etag'], cld.get('page_size'), cld.get('page_index'))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+        results = paginate_list_data(snapshot['data'], **cld)
         if isinstance(results, Exception):
             return Response({'Error': results.args}, status=status.HTTP_400_BAD_REQUEST)
-        return Response(results, status=status.HTTP_200_OK)
+        return conditional_response(request, etag, results)
 
 class DishesDetail(generics.GenericAPIView):
     # queryset = Dishes.objects.all()
@@ -50,6 +58,8 @@ class DishesDetail(generics.GenericAPIView):
     # permissions = (IsOwnerOrReadOnly,)
 
     def get_object(self, *args, **kwargs):
+        if 'pk' in kwargs:
+            return DishesCache().get_dishes_detail(kwargs['pk'])
         return Dishes.get_hot_sale_object(**kwargs)
 
     def post(self, request, *args, **kwargs):
@@ -65,7 +75,54 @@ class DishesDetail(generics.GenericAPIView):
             return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
         cld = form.cleaned_data
         object_data = self.get_object(**cld)
-        return Response(object_data, status=status.HTTP_200_OK)
+        if isinstance(object_data, Exception):
+            return Response({'Error': object_data.args}, status=status.HTTP_400_BAD_REQUEST)
+        return conditional_response(request, make_data_etag(object_data), object_data)
+
+class DishesSearch(generics.GenericAPIView):
+    """
+    在美食城内搜索菜品（按菜品标题及副标题）
+    """
+    serializer_class = DishesDetailSerializer
+
+    def search_dishes_ids(self, food_court_id, keywords):
+        return get_search_index(food_court_id).search(keywords)
+
+    def get_dishes_details(self, food_court_id, dishes_ids):
+        details = DishesCache().get_dishes_detail_dicts(dishes_ids)
+        return [item for item in details
+                if not isinstance(item, Exception) and item['food_court_id'] == food_court_id]
+
+    def post(self, request, *args, **kwargs):
+        """
+        带分页功能
+        返回数据格式为：{'count': 当前返回的数据量,
+                       'all_count': 总数据量,
+                       'has_next': 是否有下一页,
+                       'data': [{
+                                 菜品详情
+                                },...]
+                       }
+        """
+        form = DishesSearchForm(request.data)
+        if not form.is_valid():
+            return Response(form.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        cld = form.cleaned_data
+        dishes_ids = self.search_dishes_ids(cld['food_court_id'], cld['keywords'])
+        # 先对菜品ID分页，只获取当前页菜品的详情
+        results = paginate_list_data(dishes_ids, **cld)
+        if isinstance(results, Exception):
+            return Response({'Error': results.args}, status=status.HTTP_400_BAD_REQUEST)
+
+        object_data = self.get_dishes_details(cld['food_court_id'], results['data'])
+        serializer = HotSaleSerializer(data=object_data)
+        if not serializer.is_valid():
+            return Response({'Error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        results['data'] = serializer.perfect_result()
+        results['count'] = len(results['data'])
+        return Response(results, status=status.HTTP_200_OK)
+
 
 class FoodCourtList(generics.GenericAPIView):
     queryset = FoodCourt.objects.all()
@@ -75,6 +132,14 @@ class FoodCourtList(generics.GenericAPIView):
     def get_object_list(self, **kwargs):
         return FoodCourt.get_object_list(**kwargs)
 
+    def get_list_etag(self, filter_list, **kwargs):
+        """
+        ETag：数据量 + 最大ID + 查询参数 + 时间片（美食城数据没有更新时间，ETag最多10分钟后失效）
+        """
+        stats = filter_list.aggregate(count=Count('id'), max_id=Max('id'))
+        return make_etag(stats['count'], stats['max_id'], get_time_bucket(),
+                         sorted(kwargs.items()))
+
 
     def post(self, request, *args, **kwargs):
         """
@@ -101,7 +166,8 @@ class FoodCourtList(generics.GenericAPIView):
         results = serializer.list_data(**cld)
         if isinstance(results, Exception):
             return Response({'Error': results.args}, status=status.HTTP_400_BAD_REQUEST)
-        return Response(results, status=status.HTTP_200_OK)
+        # 美食城数据没有更新时间，ETag由当前页的数据生成（数据修改后ETag随之变化）
+        return conditional_response(request, make_data_etag(results), results)
 
 
 class FoodCourtDetail(generics.GenericAPIView):
@@ -126,5 +192,7 @@ class FoodCourtDetail(generics.GenericAPIView):
             obj = self.get_object_detail(**cld)
         except Exception as e:
             return Response({'Error': e.args}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(obj, Exception):
+            return Response({'Error': obj.args}, status=status.HTTP_400_BAD_REQUEST)
         serializer = FoodCourtSerializer(obj)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return conditional_response(request, make_data_etag(serializer.data), serializer.data)
@@ -0,0 +1,100 @@
+# -*- coding:utf8 -*-
+from horizon import redis
+import json
+
+
+# 发起微信支付的任务状态key（按订单ID）
+JS_API_TASK_KEY = 'wxpay_js_api_task:%s'
+
+# 任务执行中状态的过期时间（大于调用微信支付接口的最长耗时），单位：秒
+JS_API_PENDING_TIMEOUT = 30
+# 任务结果的保存时间（客户端在此时间内再次请求即可获取结果），单位：秒
+JS_API_RESULT_TIMEOUT = 60
+
+# 微信支付预支付交易会话标识（prepay_id）key（按订单ID）
+PREPAY_KEY = 'wxpay_prepay:%s'
+# prepay_id的有效期为2小时，提前5分钟失效，单位：秒
+PREPAY_TIMEOUT = 60 * 115
+
+
+class JsApiTaskCache(object):
+    """
+    发起微信支付的任务状态（存储在consumer缓存数据库中，各进程共享）
+    数据格式：{'status': 'pending' / 'done' / 'error', 'data': 支付参数或错误信息}
+    缓存服务器不可用时不影响支付，只是不能在进程间传递任务结果
+    """
+    def __init__(self):
+        self.handle = redis.get_redis_connection('consumer')
+
+    def get(self, orders_id):
+        try:
+            task = self.handle.get(JS_API_TASK_KEY % orders_id)
+        except redis.RedisError:
+            return None
+        if task is None:
+            return None
+        return json.loads(task)
+
+    def start(self, orders_id):
+        """
+        标记任务开始执行，同一订单已有任务在执行时返回False
+        """
+        task = json.dumps({'status': 'pending'})
+        try:
+            return bool(self.handle.set(JS_API_TASK_KEY % orders_id, task,
+                                        ex=JS_API_PENDING_TIMEOUT, nx=True))
+        except redis.RedisError:
+            return True
+
+    def set_result(self, orders_id, result):
+        if isinstance(result, Exception):
+            task = {'status': 'error', 'data': list(result.args)}
+        else:
+            task = {'status': 'done', 'data': result}
+        try:
+            self.handle.set(JS_API_TASK_KEY % orders_id, json.dumps(task),
+                            ex=JS_API_RESULT_TIMEOUT)
+        except redis.RedisError:
+            pass
+
+    def delete(self, orders_id):
+        try:
+            self.handle.delete(JS_API_TASK_KEY % orders_id)
+        except redis.RedisError:
+            pass
+
+
+class PrepayCache(object):
+    """
+    微信支付预支付结果（prepay_id）缓存，有效期内同一订单再次发起支付时，
+    只需用prepay_id重新生成公众号支付参数并签名，无需再调用统一下单接口
+    数据格式：{'appid': 公众账号ID, 'prepay_id': 预支付交易会话标识, 'total_fee': 订单金额（分）}
+    """
+    def __init__(self):
+        self.handle = redis.get_redis_connection('consumer')
+
+    def get(self, orders_id, total_fee):
+        try:
+            prepay = self.handle.get(PREPAY_KEY % orders_id)
+        except redis.RedisError:
+            return None
+        if prepay is None:
+            return None
+        prepay = json.loads(prepay)
+        # 订单金额不一致时（不应出现），重新调用统一下单接口
+        if prepay['total_fee'] != total_fee:
+            return None
+        return prepay
+
+    def set(self, orders_id, appid, prepay_id, total_fee, timeout=PREPAY_TIMEOUT):
+        """
+        timeout: 有效时间（单位：秒），不超过PREPAY_TIMEOUT
+        """
+        timeout = int(min(timeout, PREPAY_TIMEOUT))
+        if timeout <= 0:
+            return
+        prepay = {'appid': appid, 'prepay_id': prepay_id, 'total_fee': total_fee}
+        try:
+            self.handle.set(PREPAY_KEY % orders_id, json.dumps(prepay), ex=timeout)
+        except redis.RedisError:
+            pass
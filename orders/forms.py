@@ -1,5 +1,6 @@
 # -*- encoding: utf-8 -*-
 from horizon import forms
+from django.conf import settings
 
 
 class PayOrdersCreateForm(forms.Form):
@@ -20,3 +21,15 @@ class PayOrdersUpdateForm(forms.Form):
     orders_id = forms.CharField(max_length=32)
     # 支付模式 1：钱包 2：微信支付 3：支付宝支付
     payment_mode = forms.IntegerField(min_value=1, max_value=3)
+
+
+class PayOrdersListForm(forms.Form):
+    # 支付状态 0:未支付 200:已支付 400: 已过期 500:支付失败
+    payment_status = forms.IntegerField(min_value=0, required=False)
+    page_size = forms.IntegerField(min_value=1, max_value=settings.MAX_PAGE_SIZE, required=False)
+    cursor = forms.CharField(max_length=256, required=False)
+    with_count = forms.BooleanField(required=False)
+
+
+class PayOrdersDetailForm(forms.Form):
+    orders_id = forms.CharField(max_length=32)
@@ -0,0 +1,24 @@
+# -*- coding:utf8 -*-
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from orders.models import PayOrders, ConsumeOrders, TradeRecord
+
+
+class Command(BaseCommand):
+    help = u'补齐订单、交易记录及钱包历史数据的整数金额字段（单位：分）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=1000)
+
+    def get_models(self):
+        models = [PayOrders, ConsumeOrders, TradeRecord]
+        # 钱包应用启用（加入INSTALLED_APPS）后一并补齐
+        if apps.is_installed('wallet'):
+            from wallet.models import Wallet
+            models.append(Wallet)
+        return models
+
+    def handle(self, *args, **options):
+        for model in self.get_models():
+            updated_count = model.backfill_money_cents(batch_size=options['batch_size'])
+            self.stdout.write('%s: %s rows' % (model._meta.db_table, updated_count))
@@ -0,0 +1,16 @@
+# -*- coding:utf8 -*-
+from django.core.management.base import BaseCommand
+from orders.models import PayOrders, EXPIRE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = u'批量将已过期的未支付订单标记为过期（可由crontab定时执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', dest='batch_size', type=int, default=EXPIRE_BATCH_SIZE)
+        parser.add_argument('--max-batches', dest='max_batches', type=int, default=None)
+
+    def handle(self, *args, **options):
+        expired_count = PayOrders.expire_unpaid_orders(batch_size=options['batch_size'],
+                                                       max_batches=options['max_batches'])
+        self.stdout.write('expired %s pay orders' % expired_count)
@@ -0,0 +1,132 @@
+# -*- coding:utf8 -*-
+from django.core.management.base import BaseCommand, CommandError
+import datetime
+import timeit
+
+
+def measure(func, number, repeat=3):
+    """
+    单次调用的耗时（单位：秒，取repeat轮中最快的一轮）
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def benchmark_perfect_result():
+    """
+    MAX_PAGE_SIZE（500）条数据一页的后处理耗时：字段计划 vs 逐字段类型判断
+    """
+    from hot_sale.tests import make_instances, BenchmarkListSerializer, LegacyBenchmarkListSerializer
+
+    instances = make_instances()
+    legacy_seconds = measure(lambda: LegacyBenchmarkListSerializer(instances).perfect_result(), 20)
+    plan_seconds = measure(lambda: BenchmarkListSerializer(instances).perfect_result(), 20)
+    return 'perfect_result (%s rows): legacy %.2f ms, field plan %.2f ms' % (
+        len(instances), legacy_seconds * 1000, plan_seconds * 1000)
+
+
+def benchmark_orders_id():
+    """
+    并发生成订单号的吞吐量（每次加锁事务耗时2毫秒）：每个订单都加锁（号段大小为1） vs 按号段预留
+    """
+    from django.test.utils import override_settings
+    from Business_App.bz_orders.models import ORDERS_ID_BLOCK_SIZE
+    from orders.tests import (FakeOrdersIdRow, run_threads, run_processes,
+                              use_orders_id_row, restore_orders_id_row)
+
+    date_day = datetime.date.today()
+    workers, count = 8, 100
+    lines = []
+    with override_settings(ID_GENERATOR_BACKEND='database'):
+        for name, run in (('threads', run_threads), ('processes', run_processes)):
+            throughput = []
+            for block_size in (1, ORDERS_ID_BLOCK_SIZE):
+                origin_reserve = use_orders_id_row(FakeOrdersIdRow(latency=0.002, block_size=block_size))
+                try:
+                    results, seconds = run(date_day, workers, count)
+                finally:
+                    restore_orders_id_row(origin_reserve)
+                throughput.append(len(results) / seconds)
+            lines.append('orders id (%s x %s %s): per-order lock %.0f/s, block of %s %.0f/s' %
+                         (workers, count, name, throughput[0], ORDERS_ID_BLOCK_SIZE, throughput[1]))
+    return '\n'.join(lines)
+
+
+def benchmark_checkout_response():
+    """
+    每次生成订单的返回数据耗时：模型序列化 + JSON解析 + 再次校验 vs 由内存中的数据直接生成
+    """
+    from orders.tests import make_checkout_instance, legacy_checkout_response, checkout_response
+
+    instance = make_checkout_instance()
+    legacy_seconds = measure(lambda: legacy_checkout_response(instance), 200)
+    seconds = measure(lambda: checkout_response(instance), 200)
+    return ('checkout response (3 businesses x 5 dishes): legacy %.3f ms, in-memory %.3f ms, '
+            'saved %.3f ms per checkout' %
+            (legacy_seconds * 1000, seconds * 1000, (legacy_seconds - seconds) * 1000))
+
+
+def benchmark_wxpay_sign():
+    """
+    签名及验证签名（JsApiCallback.is_sign_valid）的耗时：之前的签名方式 vs 单次遍历的签名方式
+    """
+    from horizon import main
+    from PAY.wxpay.tests import (legacy_make_sign_for_wxpay, legacy_verify_sign_for_wxpay,
+                                 make_notify_data, is_sign_valid,
+                                 use_fake_pay_result, restore_pay_result)
+
+    data_dict = make_notify_data()
+    results = []
+    origin_get_object = use_fake_pay_result()
+    try:
+        for name, func in (
+                ('legacy sign', lambda: legacy_make_sign_for_wxpay(data_dict)),
+                ('sign MD5', lambda: main.make_sign_for_wxpay(data_dict, 'MD5')),
+                ('sign HMAC-SHA256', lambda: main.make_sign_for_wxpay(data_dict, 'HMAC-SHA256')),
+                ('legacy verify', lambda: legacy_verify_sign_for_wxpay(data_dict, data_dict['sign'])),
+                ('verify MD5', lambda: main.verify_sign_for_wxpay(data_dict, data_dict['sign'], 'MD5')),
+                ('is_sign_valid', lambda: is_sign_valid(data_dict))):
+            results.append('%s %.1f us' % (name, measure(func, 2000) * 1000000))
+    finally:
+        restore_pay_result(origin_get_object)
+    return 'wxpay sign (%s fields): %s' % (len(data_dict), ', '.join(results))
+
+
+def benchmark_datetime_field():
+    """
+    单个时间字段的格式化耗时：ISO字符串 + timezoneStringTostring解析 vs 直接格式化
+    """
+    from horizon.serializers import DateTimeField
+    from hot_sale.tests import make_datetimes, legacy_datetime_representation
+
+    values = make_datetimes()
+    field = DateTimeField()
+    legacy_seconds = measure(lambda: [legacy_datetime_representation(value) for value in values], 20)
+    seconds = measure(lambda: [field.to_representation(value) for value in values], 20)
+    return 'datetime field (per value): legacy %.2f us, direct format %.2f us' % (
+        legacy_seconds / len(values) * 1000000, seconds / len(values) * 1000000)
+
+
+# 名称: 对比函数（返回结果说明）
+BENCHMARKS = (
+    ('datetime_field', benchmark_datetime_field),
+    ('perfect_result', benchmark_perfect_result),
+    ('orders_id', benchmark_orders_id),
+    ('checkout_response', benchmark_checkout_response),
+    ('wxpay_sign', benchmark_wxpay_sign),
+)
+
+
+class Command(BaseCommand):
+    help = u'性能对比（优化前的实现 vs 当前实现），不指定名称时运行全部：%s' % ', '.join(
+        name for name, _ in BENCHMARKS)
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*')
+
+    def handle(self, *args, **options):
+        benchmarks = dict(BENCHMARKS)
+        names = options['names'] or [name for name, _ in BENCHMARKS]
+        for name in names:
+            if name not in benchmarks:
+                raise CommandError('Unknown benchmark: %s' % name)
+            self.stdout.write(benchmarks[name]())
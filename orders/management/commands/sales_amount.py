@@ -0,0 +1,27 @@
+# -*- coding:utf8 -*-
+from django.core.management.base import BaseCommand
+from orders.models import ConsumeOrders
+from horizon.money import cents_to_string
+import datetime
+
+
+class Command(BaseCommand):
+    help = u'统计已支付子订单的销售额（数据库端汇总），可按商户、美食城及日期筛选'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--business-id', dest='business_id', type=int, default=None)
+        parser.add_argument('--food-court-id', dest='food_court_id', type=int, default=None)
+        parser.add_argument('--date', dest='date', default=None, help=u'统计日期，如：2017-05-19')
+
+    def handle(self, *args, **options):
+        kwargs = {}
+        for key in ('business_id', 'food_court_id'):
+            if options[key] is not None:
+                kwargs[key] = options[key]
+        if options['date']:
+            date_day = datetime.datetime.strptime(options['date'], '%Y-%m-%d')
+            kwargs['created__gte'] = date_day
+            kwargs['created__lt'] = date_day + datetime.timedelta(days=1)
+        result = ConsumeOrders.get_sales_amount(**kwargs)
+        self.stdout.write('sales amount: %s (%s orders)' %
+                          (cents_to_string(result['payable_cents']), result['count']))
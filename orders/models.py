@@ -2,35 +2,62 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.db.models import Case, When, Value, F, Sum, Count
+from django.db.models.functions import Coalesce
 from django.utils.timezone import now
 from horizon.models import model_to_dict
+from horizon.money import MoneyCentsMixin, to_cents, money_cents_expression
 from horizon.main import minutes_30_plus, DatetimeEncode
 from django.db import transaction
 from decimal import Decimal
 
 from Business_App.bz_dishes.models import Dishes
 from Business_App.bz_orders.models import OrdersIdGenerator
+from horizon import redis
+from horizon.counters import (RedisDailyCounter,
+                              is_redis_backend,
+                              get_max_issued_number,
+                              DATABASE_FALLBACK_START)
 
 import json
 import datetime
 
 
-class OrdersManager(models.Manager):
-    def get(self, *args, **kwargs):
-        object_data = super(OrdersManager, self).get(*args, **kwargs)
-        if now() >= object_data.expires and object_data.payment_status == 0:
-            object_data.payment_status = 400
-        return object_data
+# 批量标记过期订单时，每条UPDATE语句更新的最大订单数量
+EXPIRE_BATCH_SIZE = 500
 
-    def filter(self, *args, **kwargs):
-        object_data = super(OrdersManager, self).filter(*args, **kwargs)
-        for item in object_data:
-            if now() >= item.expires and item.payment_status == 0:
-                item.payment_status = 400
-        return object_data
+
+class PaymentStatusError(Exception):
+    """
+    订单当前的支付状态不能更改为回调结果中的状态（如：重复的支付结果通知）
+    """
+
+
+class OrdersQuerySet(models.QuerySet):
+    def with_effective_status(self):
+        """
+        在数据库中计算订单的实际支付状态（effective_status）：
+        未支付（payment_status为0）且已过期的订单，实际支付状态为400（已过期）
+        """
+        if 'effective_status' in self.query.annotations:
+            return self
+        return self.annotate(effective_status=Case(
+            When(payment_status=0, expires__lte=now(), then=Value(400)),
+            default=F('payment_status'),
+            output_field=models.IntegerField()))
+
+    def filter_by_effective_status(self, *status):
+        return self.with_effective_status().filter(effective_status__in=status)
+
+
+class OrdersManager(models.Manager.from_queryset(OrdersQuerySet)):
+    """
+    实际支付状态（effective_status）只在需要读取或过滤时用with_effective_status()计算，
+    默认的queryset不附加，count()、aggregate()等仍为简单的SQL
+    """
 
 
-class PayOrders(models.Model):
+class PayOrders(MoneyCentsMixin, models.Model):
     """
     支付订单（主订单）
     """
@@ -49,6 +76,11 @@ class PayOrders(models.Model):
     member_discount = models.CharField('会员优惠', max_length=16, default='0')
     other_discount = models.CharField('其他优惠', max_length=16, default='0')
     payable = models.CharField('应付金额', max_length=16)
+    # 整数金额（单位：分），与上面的字符串金额同时写入，历史数据由backfill_money_cents补齐
+    total_amount_cents = models.BigIntegerField('订单总计（分）', null=True)
+    member_discount_cents = models.BigIntegerField('会员优惠（分）', null=True)
+    other_discount_cents = models.BigIntegerField('其他优惠（分）', null=True)
+    payable_cents = models.BigIntegerField('应付金额（分）', null=True)
 
     # 0:未支付 200:已支付 400: 已过期 500:支付失败
     payment_status = models.IntegerField('订单支付状态', default=0)
@@ -63,10 +95,12 @@ class PayOrders(models.Model):
     extend = models.TextField('扩展信息', default='', blank=True)
 
     objects = OrdersManager()
+    money_fields = ('total_amount', 'member_discount', 'other_discount', 'payable')
 
     class Meta:
         db_table = 'ys_pay_orders'
         ordering = ['-orders_id']
+        index_together = [('payment_status', 'expires'), ('user_id', 'created')]
 
     def __unicode__(self):
         return self.orders_id
@@ -78,6 +112,45 @@ class PayOrders(models.Model):
         except Exception as e:
             return e
 
+    @classmethod
+    def get_detail(cls, **kwargs):
+        """
+        订单详情（包含实际支付状态effective_status）
+        """
+        try:
+            return cls.objects.with_effective_status().get(**kwargs)
+        except Exception as e:
+            return e
+
+    @classmethod
+    def get_object_list(cls, request, **kwargs):
+        """
+        用户的订单列表（可按实际支付状态过滤），
+        列表输出时的实际支付状态由PayOrdersListSerializer在查询当前页时计算
+        """
+        queryset = cls.objects.filter(user_id=request.user.id)
+        if 'payment_status' in kwargs:
+            queryset = queryset.filter_by_effective_status(kwargs['payment_status'])
+        return queryset
+
+    @classmethod
+    def get_max_orders_number(cls, date_day):
+        """
+        当天已写入数据库的最大订单号（整数部分），用于初始化缓存服务器的订单号计数
+        """
+        return get_max_issued_number(cls.objects.all(), 'orders_id', date_day.strftime('%Y%m%d'))
+
+    @classmethod
+    def load_consume_orders(cls, instances):
+        """
+        一次查询加载多个主订单的子订单，保存在主订单的consume_orders属性中
+        """
+        consume_orders_dict = ConsumeOrders.get_objects_dict_by_master_orders_ids(
+            [item.orders_id for item in instances])
+        for item in instances:
+            item.consume_orders = consume_orders_dict.get(item.orders_id, [])
+        return instances
+
     @classmethod
     def get_valid_orders(cls, **kwargs):
         kwargs['payment_status'] = 0
@@ -107,10 +180,11 @@ class PayOrders(models.Model):
         dishes_details_list = []
         food_court_id = None
         food_court_name = None
-        for item in dishes_ids:
+        # 生成订单时从数据库读取菜品详情（价格、状态），不使用可能已过期的缓存
+        details = Dishes.get_dishes_detail_dicts([int(item['dishes_id']) for item in dishes_ids])
+        for item, detail_dict in zip(dishes_ids, details):
             dishes_id = item['dishes_id']
             count = item['count']
-            detail_dict = Dishes.get_dishes_detail_dict_with_user_info(pk=dishes_id)
             if isinstance(detail_dict, Exception):
                 raise ValueError('Dishes ID %s does not existed' % dishes_id)
             detail_dict['count'] = count
@@ -145,11 +219,15 @@ class PayOrders(models.Model):
             for item2 in _details['dishes_detail']:
                 total_amount = str(Decimal(total_amount) +
                                    Decimal(item2['price']) * item2['count'])
+                # 时间转换为与保存的JSON数据一致的字符串，生成订单后可直接用于返回数据
+                for key, value in item2.items():
+                    if isinstance(value, datetime.datetime):
+                        item2[key] = str(value)
         # 会员优惠及其他优惠
         member_discount = 0
         other_discount = 0
         orders_data = {'user_id': request.user.id,
-                       'orders_id': OrdersIdGenerator.get_orders_id(),
+                       'orders_id': OrdersIdGenerator.get_orders_id(cls.get_max_orders_number),
                        'food_court_id': food_court_id,
                        'food_court_name': food_court_name,
                        'dishes_ids': json.dumps(dishes_details, ensure_ascii=False, cls=DatetimeEncode),
@@ -160,6 +238,11 @@ class PayOrders(models.Model):
                                       Decimal(member_discount) -
                                       Decimal(other_discount))
                        }
+        # 订单明细（与订单在同一个事务中保存）
+        orders_data['orders_dishes'] = OrdersDishes.make_instances(
+            orders_data['orders_id'], request.user.id, dishes_details)
+        # 订购列表详情（未编码的数据，用于生成订单后的返回数据）
+        orders_data['dishes_details'] = dishes_details
         return orders_data
 
     @classmethod
@@ -180,16 +263,42 @@ class PayOrders(models.Model):
                 _instance = cls.objects.select_for_update().get(orders_id=orders_id)
             except cls.DoesNotExist:
                 raise cls.DoesNotExist
-            if _instance.payment_status != 0:
-                raise Exception('Cannot perform this action')
+            # 已被批量标记为过期（400）的订单，支付成功的通知仍然有效
+            if _instance.payment_status != 0 and \
+                    not (_instance.payment_status == 400 and payment_status == 200):
+                raise PaymentStatusError('Cannot perform this action')
             _instance.payment_status = payment_status
             _instance.payment_mode = payment_mode
             _instance.save()
             instance = _instance
         return instance
 
-
-class ConsumeOrders(models.Model):
+    @classmethod
+    def expire_unpaid_orders(cls, batch_size=EXPIRE_BATCH_SIZE, max_batches=None):
+        """
+        批量将已过期的未支付订单标记为过期（payment_status: 0 -> 400），返回更新的订单数量
+        每批先按索引(payment_status, expires)查出batch_size个订单ID，再按主键更新，
+        UPDATE语句中再次检查支付状态，与支付回调的select_for_update互不覆盖
+        """
+        expires_time = now()
+        expired_count = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            orders_ids = list(cls._base_manager.filter(payment_status=0, expires__lte=expires_time)
+                              .order_by('expires').values_list('pk', flat=True)[:batch_size])
+            if not orders_ids:
+                break
+            with transaction.atomic():
+                expired_count += cls._base_manager.filter(
+                    pk__in=orders_ids, payment_status=0, expires__lte=expires_time
+                ).update(payment_status=400)
+            batches += 1
+            if len(orders_ids) < batch_size:
+                break
+        return expired_count
+
+
+class ConsumeOrders(MoneyCentsMixin, models.Model):
     """
     消费订单（子订单）
     """
@@ -207,6 +316,11 @@ class ConsumeOrders(models.Model):
     member_discount = models.CharField('会员优惠', max_length=16, default='0')
     other_discount = models.CharField('其他优惠', max_length=16, default='0')
     payable = models.CharField('应付金额', max_length=16)
+    # 整数金额（单位：分），与上面的字符串金额同时写入，历史数据由backfill_money_cents补齐
+    total_amount_cents = models.BigIntegerField('订单总计（分）', null=True)
+    member_discount_cents = models.BigIntegerField('会员优惠（分）', null=True)
+    other_discount_cents = models.BigIntegerField('其他优惠（分）', null=True)
+    payable_cents = models.BigIntegerField('应付金额（分）', null=True)
 
     # 0:未支付 200:已支付 201:待消费 206:已完成 400: 已过期 500:支付失败
     payment_status = models.IntegerField('订单支付状态', default=201)
@@ -215,7 +329,7 @@ class ConsumeOrders(models.Model):
     # 订单类型 1: 在线订单 2：堂食订单
     orders_type = models.IntegerField('订单类型', default=1)
     # 所属主订单
-    master_orders_id = models.CharField('所属主订单订单ID', max_length=32)
+    master_orders_id = models.CharField('所属主订单订单ID', max_length=32, db_index=True)
 
     created = models.DateTimeField('创建时间', default=now)
     updated = models.DateTimeField('最后修改时间', auto_now=True)
@@ -223,6 +337,7 @@ class ConsumeOrders(models.Model):
     extend = models.TextField('扩展信息', default='', blank=True)
 
     objects = OrdersManager()
+    money_fields = ('total_amount', 'member_discount', 'other_discount', 'payable')
 
     class Meta:
         db_table = 'ys_consume_orders'
@@ -231,6 +346,32 @@ class ConsumeOrders(models.Model):
     def __unicode__(self):
         return self.orders_id
 
+    @classmethod
+    def get_objects_dict_by_master_orders_ids(cls, master_orders_ids):
+        """
+        返回数据格式为：{主订单ID: [子订单, ...], ...}
+        """
+        consume_orders_dict = {}
+        if not master_orders_ids:
+            return consume_orders_dict
+        instances = (cls.objects.filter(master_orders_id__in=master_orders_ids)
+                     .with_effective_status().order_by('orders_id'))
+        for item in instances:
+            consume_orders_dict.setdefault(item.master_orders_id, []).append(item)
+        return consume_orders_dict
+
+    @classmethod
+    def get_sales_amount(cls, **kwargs):
+        """
+        已支付子订单的销售额统计（数据库端SUM，单位：分），如：按商户统计 business_id=xxx
+        整数金额尚未补齐的历史数据由字符串金额计算
+        """
+        kwargs['payment_status__in'] = (200, 201, 206)
+        result = cls._base_manager.filter(**kwargs).aggregate(
+            payable=Sum(Coalesce('payable_cents', money_cents_expression('payable'))),
+            count=Count('pk'))
+        return {'payable_cents': result['payable'] or 0, 'count': result['count']}
+
 #
 #     @classmethod
 #     def update_payment_status_by_pay_callback(cls, orders_id, validated_data):
@@ -259,7 +400,7 @@ class ConsumeOrders(models.Model):
 #         return instance
 
 
-class TradeRecord(models.Model):
+class TradeRecord(MoneyCentsMixin, models.Model):
     """
     交易记录
     """
@@ -271,6 +412,11 @@ class TradeRecord(models.Model):
     member_discount = models.CharField('会员优惠', max_length=16, default='0')
     other_discount = models.CharField('其他优惠', max_length=16, default='0')
     payment = models.CharField('实付金额', max_length=16)
+    # 整数金额（单位：分）
+    total_amount_cents = models.BigIntegerField('应付金额（分）', null=True)
+    member_discount_cents = models.BigIntegerField('会员优惠（分）', null=True)
+    other_discount_cents = models.BigIntegerField('其他优惠（分）', null=True)
+    payment_cents = models.BigIntegerField('实付金额（分）', null=True)
 
     # 支付结果: SUCCESS: 成功 FAIL：失败 UNKNOWN: 未知
     payment_result = models.IntegerField('支付结果', default='UNKNOWN')
@@ -283,13 +429,106 @@ class TradeRecord(models.Model):
     created = models.DateTimeField('创建时间', default=now)
     extend = models.TextField('扩展信息', default='', blank=True)
 
-    objects = OrdersManager()
+    money_fields = ('total_amount', 'member_discount', 'other_discount', 'payment')
+
+    @classmethod
+    def get_max_serial_number(cls, date_day):
+        """
+        当天已写入数据库的最大交易流水号（整数部分），用于初始化缓存服务器的流水号计数
+        """
+        return get_max_issued_number(cls.objects.all(), 'serial_number',
+                                     'LS%s' % date_day.strftime('%Y%m%d'))
+
+
+class OrdersDishes(models.Model):
+    """
+    订单明细（每个订单中的每个菜品一条记录）
+    """
+    # 所属主订单
+    orders_id = models.CharField('主订单ID', db_index=True, max_length=32)
+    # 所属子订单（支付成功拆分子订单后写入）
+    consume_orders_id = models.CharField('子订单ID', db_index=True, max_length=32, default='')
+    user_id = models.IntegerField('用户ID')
+    dishes_id = models.IntegerField('菜品ID', db_index=True)
+    business_id = models.IntegerField('商户ID')
+    food_court_id = models.IntegerField('美食城ID')
+
+    # 单价（单位：分）
+    price_cents = models.BigIntegerField('单价（分）')
+    count = models.IntegerField('数量')
+
+    created = models.DateTimeField('创建时间', default=now)
+
+    class Meta:
+        db_table = 'ys_orders_dishes'
+        index_together = [('business_id', 'created'), ('food_court_id', 'created')]
+
+    def __unicode__(self):
+        return '%s:%s' % (self.orders_id, self.dishes_id)
+
+    @classmethod
+    def make_instances(cls, orders_id, user_id, dishes_details, consume_orders_ids=None):
+        """
+        由订购列表详情生成订单明细（未保存）
+        consume_orders_ids: {商户ID: 子订单ID}
+        """
+        consume_orders_ids = consume_orders_ids or {}
+        instances = []
+        for business_dishes in dishes_details:
+            business_id = business_dishes['business_id']
+            for item in business_dishes['dishes_detail']:
+                instances.append(cls(orders_id=orders_id,
+                                     consume_orders_id=consume_orders_ids.get(business_id, ''),
+                                     user_id=user_id,
+                                     dishes_id=item['id'],
+                                     business_id=business_id,
+                                     food_court_id=item['food_court_id'],
+                                     price_cents=to_cents(item['price']),
+                                     count=item['count']))
+        return instances
+
+    @classmethod
+    def set_consume_orders_ids(cls, orders_id, consume_orders_ids):
+        """
+        拆分子订单后，一条UPDATE语句写入各商户菜品所属的子订单ID，返回更新的数据量
+        consume_orders_ids: {商户ID: 子订单ID}
+        """
+        if not consume_orders_ids:
+            return 0
+        return cls.objects.filter(orders_id=orders_id).update(consume_orders_id=Case(
+            *[When(business_id=business_id, then=Value(consume_orders_id))
+              for business_id, consume_orders_id in consume_orders_ids.items()],
+            default=F('consume_orders_id'),
+            output_field=models.CharField()))
+
+    @classmethod
+    def get_sales_ranking(cls, limit=10, **kwargs):
+        """
+        已支付菜品的销量排行（按索引过滤，如：food_court_id=xxx, created__gte=xxx）
+        返回数据格式为：[{'dishes_id': 菜品ID, 'sales': 销量}, ...]
+        """
+        queryset = cls.objects.filter(**kwargs).exclude(consume_orders_id='')
+        return list(queryset.values('dishes_id').annotate(sales=Sum('count'))
+                    .order_by('-sales', 'dishes_id')[:limit])
+
+    @classmethod
+    def get_dishes_sales(cls, dishes_id, **kwargs):
+        """
+        单个菜品的销量及销售额（单位：分）
+        """
+        queryset = cls.objects.filter(dishes_id=dishes_id, **kwargs).exclude(consume_orders_id='')
+        result = queryset.aggregate(sales=Sum('count'),
+                                    amount=Sum(F('price_cents') * F('count')))
+        return {'sales': result['sales'] or 0, 'amount_cents': result['amount'] or 0}
 
 
 def date_for_model():
     return now().date()
 
 
+_serial_number_counter = RedisDailyCounter('serial_number')
+
+
 class SerialNumberGenerator(models.Model):
     date = models.DateField('日期', primary_key=True, default=date_for_model)
     serial_number = models.IntegerField('订单ID', default=1)
@@ -307,18 +546,47 @@ class SerialNumberGenerator(models.Model):
         return "%06d" % serial_no
 
     @classmethod
-    def get_serial_number(cls):
-        date_day = date_for_model()
+    def get_database_serial_number(cls, date_day, min_serial_no=0):
+        """
+        数据库生成流水号（流水号大于min_serial_no）
+        """
         # 数据库加排它锁，保证订单号是唯一的
         with transaction.atomic():
             try:
                 _instance = cls.objects.select_for_update().get(pk=date_day)
             except cls.DoesNotExist:
-                cls().save()
-                serial_no = 1
+                serial_no = min_serial_no + 1
+                cls(date=date_day, serial_number=serial_no).save(force_insert=True)
             else:
-                serial_no = _instance.serial_number + 1
+                serial_no = max(_instance.serial_number, min_serial_no) + 1
                 _instance.serial_number = serial_no
                 _instance.save()
+        return serial_no
+
+    @classmethod
+    def get_database_seed(cls, date_day):
+        """
+        缓存服务器计数的初始值：当天数据库已分配的最大流水号（不包括备用号段）
+        与交易记录中已写入的最大流水号中较大的一个
+        """
+        serial_numbers = cls.objects.filter(pk=date_day).values_list('serial_number', flat=True)
+        seed = 0
+        if serial_numbers and serial_numbers[0] < DATABASE_FALLBACK_START:
+            seed = serial_numbers[0]
+        return max(seed, TradeRecord.get_max_serial_number(date_day))
+
+    @classmethod
+    def get_serial_number(cls):
+        date_day = date_for_model()
+        serial_no = None
+        if is_redis_backend():
+            try:
+                serial_no = _serial_number_counter.next_value(
+                    date_day, lambda: cls.get_database_seed(date_day))
+            except (redis.RedisError, OverflowError):
+                # 缓存服务器不可用时，使用数据库生成流水号（只分配备用号段）
+                serial_no = cls.get_database_serial_number(date_day, DATABASE_FALLBACK_START)
+        else:
+            serial_no = cls.get_database_serial_number(date_day)
         serial_no_str = cls.int_to_string(serial_no)
         return 'LS%s%s' % (date_day.strftime('%Y%m%d'), serial_no_str)
@@ -5,10 +5,19 @@ from PAY.wxpay import settings as wx_settings
 from orders.models import PayOrders
 from users.models import ConsumerUser
 from horizon import main
+from horizon.workers import BoundedWorkerPool
+from orders.caches import JsApiTaskCache, PrepayCache
+from django.utils.timezone import now
 from django.conf import settings
 import os
 import json
-from decimal import Decimal
+import requests
+
+
+# 调用微信支付统一下单的线程池：限制同时等待微信支付响应的请求数，
+# 微信支付响应慢时，请求处理进程最多等待JSAPI_WAIT_TIMEOUT秒，不会被全部占满
+wxpay_worker_pool = BoundedWorkerPool(max_workers=wx_settings.JSAPI_WORKERS,
+                                      max_pending=wx_settings.JSAPI_MAX_PENDING)
 
 
 class WXPay(object):
@@ -16,22 +25,90 @@ class WXPay(object):
         if not isinstance(instance, PayOrders):
             raise Exception('Initialization Error')
         self.orders_id = instance.orders_id
-        self.total_fee = int(Decimal(instance.payable) * 100)
+        self.total_fee = instance.get_money_cents('payable')
         self.openid = request.user.out_open_id
         self.kwargs = {'detail': instance.dishes_ids_json_detail}
 
         self.body = u'%s-%s' % (instance.food_court_name, instance.orders_id)
+        self.expires = instance.expires
+
+    def get_cached_js_params(self):
+        """
+        同一订单的prepay_id仍有效时，直接生成新的公众号支付参数（不调用微信支付）
+        """
+        prepay = PrepayCache().get(self.orders_id, self.total_fee)
+        if prepay is None:
+            return None
+        return self.make_js_params(prepay['appid'], prepay['prepay_id'])
+
+    def make_js_params(self, appid, prepay_id):
+        """
+        生成公众号支付参数（每次重新生成时间戳、随机字符串及签名）
+        """
+        js_params_dict = {'appId': appid,
+                          'timeStamp': main.get_time_stamp(),
+                          'nonceStr': main.make_random_char_and_number_of_string(str_length=32),
+                          'package': 'prepay_id=%s' % prepay_id,
+                          'signType': wx_settings.SIGN_TYPE}
+        pay_sign = main.make_sign_for_wxpay(js_params_dict)
+        js_params_dict['paySign'] = pay_sign
+        return js_params_dict
+
+    def js_api_async(self, wait_timeout=wx_settings.JSAPI_WAIT_TIMEOUT):
+        """
+        在线程池中调用公众号支付，最多等待wait_timeout秒
+        返回：(是否已完成, 支付参数或异常)
+        未完成时任务继续执行，结果保存在缓存中，客户端再次请求时直接返回（不再调用微信支付）
+        """
+        js_params_dict = self.get_cached_js_params()
+        if js_params_dict is not None:
+            return True, js_params_dict
+
+        task_cache = JsApiTaskCache()
+        cached_task = task_cache.get(self.orders_id)
+        if cached_task is not None:
+            if cached_task['status'] == 'pending':
+                return False, None
+            # 已完成的任务结果只返回一次（支付参数之后由prepay_id缓存生成，失败时可重新发起支付）
+            task_cache.delete(self.orders_id)
+            if cached_task['status'] == 'error':
+                return True, Exception(*cached_task['data'])
+            return True, cached_task['data']
+        if not task_cache.start(self.orders_id):
+            return False, None
+
+        task = wxpay_worker_pool.submit(self.run_js_api_task, task_cache)
+        if isinstance(task, Exception):
+            task_cache.delete(self.orders_id)
+            return True, task
+        if task.wait(wait_timeout):
+            # 在等待时间内完成的任务，结果已直接返回，不再保留在缓存中（否则失败结果会在保存时间内被重复返回）
+            task_cache.delete(self.orders_id)
+            return True, task.result
+        return False, None
+
+    def run_js_api_task(self, task_cache):
+        result = self.js_api()
+        task_cache.set_result(self.orders_id, result)
+        return result
 
     def js_api(self):
         """
         公众号支付
         """
+        js_params_dict = self.get_cached_js_params()
+        if js_params_dict is not None:
+            return js_params_dict
+
         _wxpay = WXPAYJsApi(body=self.body,
                             out_trade_no=self.orders_id,
                             total_fee=self.total_fee,
                             openid=self.openid,
                             **self.kwargs)
-        results = _wxpay.go_to_pay()
+        try:
+            results = _wxpay.go_to_pay()
+        except requests.RequestException as e:
+            return e
         if results.status_code != 200:
             return Exception(results.reason)
         # 解析xml
@@ -48,15 +125,11 @@ class WXPay(object):
         serializer = wx_serializers.RequestSerializer(data=request_data)
         if serializer.is_valid():
             serializer.save()
-        js_params_dict = {'appId': xml_dict['appid'],
-                          'timeStamp': main.get_time_stamp(),
-                          'nonceStr': main.make_random_char_and_number_of_string(str_length=32),
-                          'package': 'prepay_id=%s' % xml_dict['prepay_id'],
-                          'signType': wx_settings.SIGN_TYPE}
-        pay_sign = main.make_sign_for_wxpay(js_params_dict)
-        js_params_dict['paySign'] = pay_sign
+        # prepay_id在订单过期前有效（最长2小时）
+        PrepayCache().set(self.orders_id, xml_dict['appid'], xml_dict['prepay_id'], self.total_fee,
+                          timeout=(self.expires - now()).total_seconds())
         # return_dict = {'wx_jsapi': json.dumps(js_params_dict)}
-        return js_params_dict
+        return self.make_js_params(xml_dict['appid'], xml_dict['prepay_id'])
 
     def is_response_params_valid(self):
         """
@@ -64,9 +137,5 @@ class WXPay(object):
         """
         if not isinstance(self.response_params, dict):
             return False
-        _sign = self.response_params.pop('sign')
-        maked_sign = main.make_sign_for_wxpay(self.response_params)
-
-        if maked_sign == _sign:
-            return True
-        return False
+        _sign = self.response_params.pop('sign', None)
+        return main.verify_sign_for_wxpay(self.response_params, _sign)
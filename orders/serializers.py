@@ -7,7 +7,8 @@ from horizon.serializers import BaseListSerializer, timezoneStringTostring
 from django.conf import settings
 from horizon.models import model_to_dict
 from horizon.decorators import has_permission_to_update
-from horizon.serializers import BaseSerializer
+from horizon.serializers import BaseSerializer, BaseModelSerializer, DateTimeField
+import json
 import os
 
 
@@ -26,13 +27,17 @@ class PayOrdersSerializer(serializers.ModelSerializer):
 
 
 class PayOrdersResponseSerializer(BaseSerializer):
+    """
+    生成订单后的返回数据：由刚保存的订单实例直接生成，
+    订购列表取实例的dishes_details属性（保存前的数据，无需再解析JSON）
+    """
     id = serializers.IntegerField()
     orders_id = serializers.CharField(max_length=32)
     user_id = serializers.IntegerField()
     food_court_id = serializers.IntegerField()
     food_court_name = serializers.CharField(max_length=200)
 
-    dishes_ids = serializers.ListField()
+    dishes_ids = serializers.ListField(source='dishes_details')
 
     total_amount = serializers.CharField(max_length=16)
     member_discount = serializers.CharField(max_length=16)
@@ -41,13 +46,56 @@ class PayOrdersResponseSerializer(BaseSerializer):
     payment_status = serializers.IntegerField()
     payment_mode = serializers.IntegerField()
     orders_type = serializers.IntegerField()
-    created = serializers.DateTimeField()
-    updated = serializers.DateTimeField()
-    expires = serializers.DateTimeField()
+    created = DateTimeField()
+    updated = DateTimeField()
+    expires = DateTimeField()
     extend = serializers.CharField(allow_blank=True)
 
 
 class ConsumeOrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = ConsumeOrders
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class JSONTextField(serializers.Field):
+    """
+    以JSON字符串保存的数据（如：订购列表），输出时解析为列表
+    """
+    def to_representation(self, value):
+        if not value:
+            return []
+        return json.loads(value)
+
+
+class ConsumeOrdersDetailSerializer(BaseModelSerializer):
+    # 实际支付状态（未支付且已过期的订单为400）
+    payment_status = serializers.IntegerField(source='effective_status')
+    dishes_ids = JSONTextField()
+
+    class Meta:
+        model = ConsumeOrders
+        fields = '__all__'
+
+
+class PayOrdersDetailSerializer(BaseModelSerializer):
+    payment_status = serializers.IntegerField(source='effective_status')
+    dishes_ids = JSONTextField()
+    # 子订单（由PayOrders.load_consume_orders批量加载）
+    consume_orders = ConsumeOrdersDetailSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = PayOrders
+        fields = '__all__'
+
+
+class PayOrdersListSerializer(BaseListSerializer):
+    child = PayOrdersDetailSerializer()
+    cursor_ordering = '-created'
+
+    def get_page_queryset(self, queryset):
+        return queryset.with_effective_status()
+
+    def to_representation(self, data):
+        instances = PayOrders.load_consume_orders(list(data))
+        return super(PayOrdersListSerializer, self).to_representation(instances)
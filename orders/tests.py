@@ -1,3 +1,491 @@
-from django.test import TestCase
+# -*- coding:utf8 -*-
+from django.test import SimpleTestCase, override_settings
+from Business_App.bz_orders import models as bz_orders_models
+from Business_App.bz_orders.models import OrdersIdGenerator, ORDERS_ID_BLOCK_SIZE
+from orders.models import SerialNumberGenerator, PayOrders
+from orders.serializers import PayOrdersSerializer, PayOrdersResponseSerializer
+from rest_framework import serializers
+from horizon import counters
+from horizon import redis
+from horizon.http_requests import HttpClient
+from requests.packages.urllib3.util.retry import Retry
+import datetime
+import json
+import multiprocessing
+import requests
+import socket
+import threading
+import time
 
-# Create your tests here.
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+
+class FakeOrdersIdRow(object):
+    """
+    模拟数据库中当天的订单号记录（加排它锁的事务），进程间共享
+    latency: 每次加锁事务的耗时（单位：秒）
+    block_size: 每次预留的订单号数量，为1时相当于每个订单都加锁
+    """
+    def __init__(self, latency=0.002, block_size=ORDERS_ID_BLOCK_SIZE):
+        self.latency = latency
+        self.block_size = block_size
+        self.value = multiprocessing.Value('i', 0)
+        self.lock = multiprocessing.Lock()
+
+    def reserve_orders_id_block(self, date_day, block_size=ORDERS_ID_BLOCK_SIZE, min_id=0):
+        with self.lock:
+            time.sleep(self.latency)
+            start_id = max(self.value.value, min_id) + 1
+            self.value.value = start_id + self.block_size - 1
+        return start_id, start_id + self.block_size - 1
+
+
+def take_orders_ids(date_day, count, results):
+    for _ in range(count):
+        results.append(OrdersIdGenerator.get_database_orders_id(date_day))
+
+
+def take_orders_ids_in_process(date_day, count, result_queue):
+    results = []
+    take_orders_ids(date_day, count, results)
+    result_queue.put(results)
+
+
+def run_threads(date_day, workers, count):
+    """
+    多线程并发生成订单号，返回：(订单号列表, 耗时)
+    """
+    results = []
+    threads = [threading.Thread(target=take_orders_ids, args=(date_day, count, results))
+               for _ in range(workers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.time() - start
+
+
+def run_processes(date_day, workers, count):
+    """
+    多进程并发生成订单号，返回：(订单号列表, 耗时)
+    """
+    result_queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=take_orders_ids_in_process,
+                                         args=(date_day, count, result_queue))
+                 for _ in range(workers)]
+    start = time.time()
+    for process in processes:
+        process.start()
+    results = []
+    for _ in processes:
+        results.extend(result_queue.get())
+    for process in processes:
+        process.join()
+    return results, time.time() - start
+
+
+def use_orders_id_row(row):
+    """
+    用row替换数据库中的订单号记录，返回被替换的方法（用于恢复）
+    """
+    origin_reserve = OrdersIdGenerator.__dict__['reserve_orders_id_block']
+    OrdersIdGenerator.reserve_orders_id_block = row.reserve_orders_id_block
+    bz_orders_models._orders_id_block.date = None
+    return origin_reserve
+
+
+def restore_orders_id_row(origin_reserve):
+    OrdersIdGenerator.reserve_orders_id_block = origin_reserve
+    bz_orders_models._orders_id_block.date = None
+
+
+@override_settings(ID_GENERATOR_BACKEND='database')
+class OrdersIdBlockTestCase(SimpleTestCase):
+    def setUp(self):
+        self.date_day = datetime.date.today()
+        self.origin_reserve = use_orders_id_row(FakeOrdersIdRow(latency=0))
+
+    def tearDown(self):
+        restore_orders_id_row(self.origin_reserve)
+
+    def test_threads_unique(self):
+        results, _ = run_threads(self.date_day, workers=8, count=200)
+        self.assertEqual(len(results), 8 * 200)
+        self.assertEqual(len(set(results)), len(results))
+
+    def test_processes_unique(self):
+        # 父进程已预留的号段不能被fork出的子进程继续使用
+        parent_id = OrdersIdGenerator.get_database_orders_id(self.date_day)
+        results, _ = run_processes(self.date_day, workers=4, count=200)
+        results.append(parent_id)
+        self.assertEqual(len(results), 4 * 200 + 1)
+        self.assertEqual(len(set(results)), len(results))
+
+    def test_orders_id_format(self):
+        orders_id = OrdersIdGenerator.get_orders_id()
+        self.assertEqual(len(orders_id), 14)
+        self.assertEqual(orders_id[:8], self.date_day.strftime('%Y%m%d'))
+
+
+class FakeRedis(object):
+    """
+    本地缓存服务器替身（只实现按天计数用到的命令）
+    """
+    def __init__(self, policy='noeviction'):
+        self.policy = policy
+        self.available = True
+        self.config_get_count = 0
+        self.register_script_count = 0
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def check_available(self):
+        if not self.available:
+            raise redis.ConnectionError('Redis is unavailable')
+
+    def config_get(self, pattern):
+        self.check_available()
+        self.config_get_count += 1
+        if self.policy is None:
+            raise redis.ResponseError('unknown command \'CONFIG\'')
+        return {'maxmemory-policy': self.policy}
+
+    def register_script(self, script):
+        self.register_script_count += 1
+        return FakeScript(self)
+
+    def incr_existing(self, key):
+        self.check_available()
+        with self.lock:
+            if key not in self.data:
+                return None
+            self.data[key] += 1
+            return self.data[key]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakeScript(object):
+    def __init__(self, registered_client):
+        self.registered_client = registered_client
+
+    def __call__(self, keys=(), args=(), client=None):
+        return (client or self.registered_client).incr_existing(keys[0])
+
+
+class FakePipeline(object):
+    def __init__(self, handle):
+        self.handle = handle
+        self.commands = []
+
+    def set(self, key, value, ex=None, nx=False):
+        self.commands.append(('set', key, int(value), nx))
+
+    def incr(self, key):
+        self.commands.append(('incr', key))
+
+    def execute(self):
+        self.handle.check_available()
+        results = []
+        with self.handle.lock:
+            for command in self.commands:
+                key = command[1]
+                if command[0] == 'set':
+                    if command[3] and key in self.handle.data:
+                        results.append(None)
+                    else:
+                        self.handle.data[key] = command[2]
+                        results.append(True)
+                else:
+                    self.handle.data[key] = self.handle.data.get(key, 0) + 1
+                    results.append(self.handle.data[key])
+        return results
+
+
+@override_settings(ID_GENERATOR_BACKEND='redis')
+class RedisIdGeneratorTestCase(SimpleTestCase):
+    def setUp(self):
+        self.date_day = datetime.date.today()
+        self.fake_redis = FakeRedis()
+        self.origin_get_redis_connection = redis.get_redis_connection
+        redis.get_redis_connection = lambda db_name='consumer': self.fake_redis
+        counters._checked_stores.clear()
+
+        self.max_issued_id = 0
+        self.database_row = FakeOrdersIdRow(latency=0)
+        self.origin_orders_methods = dict((name, OrdersIdGenerator.__dict__[name]) for name in
+                                          ('reserve_orders_id_block', 'get_database_seed'))
+        OrdersIdGenerator.reserve_orders_id_block = self.database_row.reserve_orders_id_block
+        OrdersIdGenerator.get_database_seed = staticmethod(lambda date_day: 0)
+        bz_orders_models._orders_id_block.date = None
+
+    def tearDown(self):
+        redis.get_redis_connection = self.origin_get_redis_connection
+        counters._checked_stores.clear()
+        for name, method in self.origin_orders_methods.items():
+            setattr(OrdersIdGenerator, name, method)
+        bz_orders_models._orders_id_block.date = None
+
+    def get_max_issued_id(self, date_day):
+        return self.max_issued_id
+
+    def take_number(self):
+        orders_id = OrdersIdGenerator.get_orders_id(self.get_max_issued_id)
+        self.assertEqual(orders_id[:8], self.date_day.strftime('%Y%m%d'))
+        return int(orders_id[8:])
+
+    def test_incr(self):
+        self.max_issued_id = 20
+        numbers = [self.take_number() for _ in range(5)]
+        start = 20 + counters.SEED_MARGIN + 1
+        self.assertEqual(numbers, list(range(start, start + 5)))
+
+    def test_lost_key_reseeds_from_issued_orders(self):
+        numbers = [self.take_number() for _ in range(5)]
+        # 缓存服务器重启（或数据被淘汰）后计数key丢失
+        self.max_issued_id = numbers[-1]
+        self.fake_redis.data.clear()
+        numbers.extend(self.take_number() for _ in range(5))
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertGreater(numbers[5], numbers[4])
+
+    def test_database_fallback(self):
+        numbers = [self.take_number() for _ in range(3)]
+        self.fake_redis.available = False
+        numbers.extend(self.take_number() for _ in range(3))
+        self.assertTrue(all(number < counters.DATABASE_FALLBACK_START for number in numbers[:3]))
+        self.assertTrue(all(number > counters.DATABASE_FALLBACK_START for number in numbers[3:]))
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    def test_eviction_policy_falls_back_to_database(self):
+        self.fake_redis.policy = 'allkeys-lru'
+        self.assertGreater(self.take_number(), counters.DATABASE_FALLBACK_START)
+        self.assertEqual(self.fake_redis.data, {})
+
+    def test_store_check_is_cached(self):
+        for policy in ('noeviction', 'allkeys-lru', None):
+            counters._checked_stores.clear()
+            self.fake_redis = FakeRedis(policy=policy)
+            for _ in range(3):
+                self.take_number()
+            self.assertEqual(self.fake_redis.config_get_count, 1)
+
+    def test_script_registered_once(self):
+        counter = counters.RedisDailyCounter('orders_id')
+        for _ in range(3):
+            counter.next_value(self.date_day, lambda: 0)
+        self.fake_redis = FakeRedis()
+        self.assertEqual(counter.next_value(self.date_day, lambda: 0), counters.SEED_MARGIN + 1)
+        self.assertEqual(self.fake_redis.register_script_count, 0)
+
+    def test_range_split(self):
+        key = counters.RedisDailyCounter('orders_id').make_key(self.date_day)
+        self.fake_redis.data[key] = counters.DATABASE_FALLBACK_START - 2
+        numbers = [self.take_number() for _ in range(3)]
+        self.assertEqual(numbers[0], counters.DATABASE_FALLBACK_START - 1)
+        self.assertEqual(numbers[1], counters.DATABASE_FALLBACK_START + 1)
+        self.assertEqual(numbers[2], counters.DATABASE_FALLBACK_START + 2)
+
+    def test_serial_number(self):
+        origin_methods = dict((name, SerialNumberGenerator.__dict__[name]) for name in
+                              ('get_database_seed', 'get_database_serial_number'))
+        SerialNumberGenerator.get_database_seed = staticmethod(lambda date_day: 7)
+        SerialNumberGenerator.get_database_serial_number = staticmethod(
+            lambda date_day, min_serial_no=0: min_serial_no + 1)
+        try:
+            serial_number = SerialNumberGenerator.get_serial_number()
+            self.fake_redis.available = False
+            fallback_serial_number = SerialNumberGenerator.get_serial_number()
+        finally:
+            for name, method in origin_methods.items():
+                setattr(SerialNumberGenerator, name, method)
+        prefix = 'LS%s' % self.date_day.strftime('%Y%m%d')
+        self.assertEqual(serial_number, '%s%06d' % (prefix, 7 + counters.SEED_MARGIN + 1))
+        self.assertEqual(fallback_serial_number,
+                         '%s%06d' % (prefix, counters.DATABASE_FALLBACK_START + 1))
+
+
+class LatencyRequestHandler(BaseHTTPRequestHandler):
+    """
+    注入延迟的http服务替身：
+      /delay/<秒数>：等待指定时间后返回200
+      /drop：读取请求后直接断开连接（不返回响应）
+    """
+    protocol_version = 'HTTP/1.1'
+    # keep-alive连接空闲超过该时间后关闭（单位：秒）
+    timeout = 2
+
+    def handle_request(self):
+        self.server.records.append((self.path, self.client_address))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        if self.path == '/drop':
+            self.close_connection = True
+            return
+        if self.path.startswith('/delay/'):
+            time.sleep(float(self.path.split('/')[-1]))
+        body = b'<xml><return_code>SUCCESS</return_code></xml>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = handle_request
+    do_POST = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+class LatencyHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = False
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), LatencyRequestHandler)
+        self.records = []
+
+    def handle_error(self, request, client_address):
+        # 客户端超时后已断开连接
+        pass
+
+
+def get_unused_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class HttpClientTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = LatencyHTTPServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.base_url = 'http://127.0.0.1:%s' % self.server.server_address[1]
+        self.client = HttpClient(timeout=(1, 0.3), retries=2)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        for _ in range(5):
+            results = self.client.post('%s/delay/0' % self.base_url, data='<xml></xml>')
+            self.assertEqual(results.status_code, 200)
+        # 同一进程内复用同一个连接
+        self.assertEqual(len(set(address for _, address in self.server.records)), 1)
+
+    def test_read_timeout_not_retried(self):
+        with self.assertRaises(requests.Timeout):
+            self.client.post('%s/delay/0.5' % self.base_url, data='<xml></xml>')
+        with self.assertRaises(requests.ConnectionError):
+            self.client.request('get', '%s/drop' % self.base_url)
+        # 请求已发出后不重试，避免重复提交
+        self.assertEqual([path for path, _ in self.server.records], ['/delay/0.5', '/drop'])
+
+    def test_connect_error_retried(self):
+        errors = []
+        origin_increment = Retry.increment
+
+        def increment(retry, *args, **kwargs):
+            errors.append(kwargs.get('error'))
+            return origin_increment(retry, *args, **kwargs)
+
+        Retry.increment = increment
+        try:
+            with self.assertRaises(requests.ConnectionError):
+                self.client.post('http://127.0.0.1:%s/' % get_unused_port(), data='<xml></xml>')
+        finally:
+            Retry.increment = origin_increment
+        # 首次连接 + retries次重试
+        self.assertEqual(len(errors), self.client.retries + 1)
+
+    def test_stats(self):
+        for _ in range(4):
+            self.client.post('%s/delay/0.05' % self.base_url, data='<xml></xml>')
+        with self.assertRaises(requests.Timeout):
+            self.client.post('%s/delay/0.5' % self.base_url, data='<xml></xml>')
+        stats = self.client.stats()
+        self.assertEqual(stats['count'], 5)
+        self.assertEqual(stats['errors'], 1)
+        self.assertGreaterEqual(stats['p50_ms'], 50)
+        self.assertGreaterEqual(stats['max_ms'], 300)
+        self.assertLess(stats['max_ms'], 500)
+        self.assertGreater(stats['avg_ms'], 0)
+
+
+class LegacyPayOrdersResponseSerializer(PayOrdersResponseSerializer):
+    dishes_ids = serializers.ListField()
+
+
+def legacy_checkout_response(instance):
+    """
+    之前的返回数据生成方式：模型序列化 -> 解析订购列表JSON -> 再次校验
+    """
+    orders_detail = PayOrdersSerializer(instance).data
+    orders_detail['dishes_ids'] = json.loads(orders_detail.pop('dishes_ids'))
+    serializer_response = LegacyPayOrdersResponseSerializer(data=orders_detail)
+    if not serializer_response.is_valid():
+        return serializer_response.errors
+    return serializer_response.data
+
+
+def checkout_response(instance):
+    return PayOrdersResponseSerializer(instance).data
+
+
+def make_checkout_instance(business_count=3, dishes_count=5):
+    created = datetime.datetime(2017, 5, 19, 9, 40, 37)
+    dishes_details = []
+    for business_id in range(1, business_count + 1):
+        dishes_detail = [{'id': business_id * 100 + index,
+                          'title': u'菜品%s' % index,
+                          'subtitle': u'副标题',
+                          'description': u'菜品描述' * 5,
+                          'price': '%s.50' % index,
+                          'image_url': 'http://yinshi.city23.com/dishes/%s.png' % index,
+                          'business_id': business_id,
+                          'business_name': u'商户%s' % business_id,
+                          'food_court_id': 1,
+                          'food_court_name': u'美食城',
+                          'created': str(created),
+                          'updated': str(created),
+                          'count': 2}
+                         for index in range(dishes_count)]
+        dishes_details.append({'dishes_detail': dishes_detail,
+                               'business_id': business_id,
+                               'business_name': u'商户%s' % business_id})
+    instance = PayOrders(id=1,
+                         orders_id='20170519000123',
+                         user_id=1,
+                         food_court_id=1,
+                         food_court_name=u'美食城',
+                         dishes_ids=json.dumps(dishes_details, ensure_ascii=False),
+                         total_amount='30.00',
+                         member_discount='0',
+                         other_discount='0',
+                         payable='30.00',
+                         created=created,
+                         updated=created,
+                         expires=created + datetime.timedelta(minutes=30))
+    instance.sync_money_cents()
+    instance.dishes_details = dishes_details
+    return instance
+
+
+class CheckoutResponseTestCase(SimpleTestCase):
+    def test_same_result_as_legacy(self):
+        instance = make_checkout_instance()
+        self.assertEqual(json.loads(json.dumps(checkout_response(instance))),
+                         json.loads(json.dumps(legacy_checkout_response(instance))))
@@ -5,7 +5,8 @@ from orders import views as orders_view
 
 urlpatterns = [
     url(r'pay_orders_action/$', orders_view.PayOrdersAction.as_view()),
-    # url(r'pay_orders_detail/$', orders_view.UserDetail.as_view()),
+    url(r'pay_orders_list/$', orders_view.PayOrdersList.as_view()),
+    url(r'pay_orders_detail/$', orders_view.PayOrdersDetail.as_view()),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
@@ -2,16 +2,21 @@
 from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework import status
+from django.db import transaction
 from orders.serializers import (PayOrdersSerializer,
                                 PayOrdersResponseSerializer,
+                                PayOrdersDetailSerializer,
+                                PayOrdersListSerializer,
                                 ConsumeOrderSerializer)
 from orders.permissions import IsOwnerOrReadOnly
-from orders.models import (PayOrders, ConsumeOrders)
+from orders.models import (PayOrders, ConsumeOrders, OrdersDishes)
 from orders.forms import (PayOrdersCreateForm,
-                          PayOrdersUpdateForm)
-from shopping_cart.serializers import ShoppingCartSerializer
+                          PayOrdersUpdateForm,
+                          PayOrdersListForm,
+                          PayOrdersDetailForm)
 from shopping_cart.models import ShoppingCart
 from orders.pay import WXPay
+from horizon.workers import WorkerPoolFull
 import json
 
 
@@ -29,40 +34,27 @@ class PayOrdersAction(generics.GenericAPIView):
     def make_orders_by_dishes_ids(self, request, dishes_ids):
         return PayOrders.make_orders_by_dishes_ids(request, dishes_ids)
 
-    def get_shopping_cart_instances_by_dishes_ids(self, request, dishes_ids):
-        instances = []
-        for item in dishes_ids:
-            dishes_id = item['dishes_id']
-            kwargs = {'count': item['count']}
-            _instance = ShoppingCart.get_object_by_dishes_id(request, dishes_id, **kwargs)
-            if isinstance(_instance, Exception):
-                return _instance
-            instances.append(_instance)
-        return instances
+    def get_shopping_cart_instances_by_dishes_ids(self, request, dishes_ids, for_update=False):
+        return ShoppingCart.get_objects_by_dishes_ids(request, dishes_ids, for_update=for_update)
 
     def check_shopping_cart(self, request, dishes_ids):
         """
-        检查购物车是否存在该物品
+        检查购物车是否存在该物品（加排它锁，防止同一购物车重复结算）
         """
-        _instances = self.get_shopping_cart_instances_by_dishes_ids(request, dishes_ids)
+        _instances = self.get_shopping_cart_instances_by_dishes_ids(request, dishes_ids,
+                                                                    for_update=True)
         if isinstance(_instances, Exception):
             return False, _instances
-        return True, None
+        return True, _instances
 
-    def clean_shopping_cart(self, request, dishes_ids):
+    def clean_shopping_cart(self, request, instances):
         """
         清空购物车
         :param request: 
-        :param dishes_ids: 
+        :param instances: 购物车中已结算的菜品
         :return: 
         """
-        _instances = self.get_shopping_cart_instances_by_dishes_ids(request, dishes_ids)
-        for _instance in _instances:
-            sc_serializer = ShoppingCartSerializer(_instance)
-            try:
-                sc_serializer.delete_instance(request, _instance)
-            except:
-                continue
+        return ShoppingCart.delete_instances(instances)
 
     def post(self, request, *args, **kwargs):
         """
@@ -77,30 +69,31 @@ class PayOrdersAction(generics.GenericAPIView):
             dishes_ids = json.loads(cld['dishes_ids'])
         except Exception as e:
             return Response({'Detail': e.args}, status=status.HTTP_400_BAD_REQUEST)
-        # 检查购物车
-        if cld['gateway'] == 'shopping_cart':
-            results = self.check_shopping_cart(request, dishes_ids)
-            if not results[0]:
-                return Response({'Detail': results[1].args}, status=status.HTTP_400_BAD_REQUEST)
 
         _data = self.make_orders_by_dishes_ids(request, dishes_ids)
         if isinstance(_data, Exception):
             return Response({'Detail': _data.args}, status=status.HTTP_400_BAD_REQUEST)
 
+        orders_dishes = _data.pop('orders_dishes')
+        dishes_details = _data.pop('dishes_details')
         serializer = PayOrdersSerializer(data=_data)
-        if serializer.is_valid():
+        if not serializer.is_valid():
+            return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        # 检查购物车、生成订单、清空购物车在同一个事务中完成
+        with transaction.atomic():
+            if cld['gateway'] == 'shopping_cart':
+                is_valid, results = self.check_shopping_cart(request, dishes_ids)
+                if not is_valid:
+                    return Response({'Detail': results.args}, status=status.HTTP_400_BAD_REQUEST)
             serializer.save()
-            # 清空购物车
+            OrdersDishes.objects.bulk_create(orders_dishes)
             if cld['gateway'] == 'shopping_cart':
-                self.clean_shopping_cart(request, dishes_ids)
-            orders_detail = serializer.data
-            dishes_detail = json.loads(orders_detail.pop('dishes_ids'))
-            orders_detail['dishes_ids'] = dishes_detail
-            serializer_response = PayOrdersResponseSerializer(data=orders_detail)
-            if serializer_response.is_valid():
-                return Response(serializer_response.data, status=status.HTTP_200_OK)
-            return Response(serializer_response.errors, status=status.HTTP_400_BAD_REQUEST)
-        return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+                self.clean_shopping_cart(request, results)
+
+        instance = serializer.instance
+        instance.dishes_details = dishes_details
+        serializer_response = PayOrdersResponseSerializer(instance)
+        return Response(serializer_response.data, status=status.HTTP_200_OK)
 
     def put(self, request, *args, **kwargs):
         """
@@ -124,7 +117,14 @@ class PayOrdersAction(generics.GenericAPIView):
             pass
         elif payment_mode == 2:   # 微信支付
             _wxpay = WXPay(request, _instance)
-            result = _wxpay.js_api()
+            is_done, result = _wxpay.js_api_async()
+            if not is_done:
+                # 微信支付处理中，客户端稍后再次请求获取支付参数
+                return Response({'orders_id': _instance.orders_id,
+                                 'Detail': 'Payment is processing, please try again later'},
+                                status=status.HTTP_202_ACCEPTED)
+            if isinstance(result, WorkerPoolFull):
+                return Response({'Detail': result.args}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
             if isinstance(result, Exception):
                 return Response({'Detail': result.args}, status=status.HTTP_400_BAD_REQUEST)
             return Response(result, status=status.HTTP_206_PARTIAL_CONTENT)
@@ -133,6 +133,67 @@ class PayOrdersAction(generics.GenericAPIView):
         return Response({}, status=status.HTTP_206_PARTIAL_CONTENT)
 
 
+class PayOrdersList(generics.GenericAPIView):
+    """
+    用户订单列表（包含子订单）
+    """
+    queryset = PayOrders.objects.all()
+    serializer_class = PayOrdersListSerializer
+    permission_classes = (IsOwnerOrReadOnly, )
+
+    def get_object_list(self, request, **kwargs):
+        return PayOrders.get_object_list(request, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        """
+        游标分页（按创建时间倒序）
+        返回数据格式为：{'count': 当前返回的数据量,
+                       'all_count': 总数据量（with_count为True时才返回）,
+                       'has_next': 是否有下一页,
+                       'next_cursor': 下一页的游标,
+                       'data': [{
+                                 PayOrders model数据（包含子订单consume_orders）
+                                },...]
+                       }
+        """
+        form = PayOrdersListForm(request.data)
+        if not form.is_valid():
+            return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        cld = form.cleaned_data
+        filter_list = self.get_object_list(request, **cld)
+        serializer = PayOrdersListSerializer(filter_list)
+        results = serializer.cursor_list_data(**cld)
+        if isinstance(results, Exception):
+            return Response({'Detail': results.args}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class PayOrdersDetail(generics.GenericAPIView):
+    """
+    用户订单详情（包含子订单）
+    """
+    queryset = PayOrders.objects.all()
+    serializer_class = PayOrdersDetailSerializer
+    permission_classes = (IsOwnerOrReadOnly, )
+
+    def get_object_detail(self, request, orders_id):
+        return PayOrders.get_detail(orders_id=orders_id, user_id=request.user.id)
+
+    def post(self, request, *args, **kwargs):
+        form = PayOrdersDetailForm(request.data)
+        if not form.is_valid():
+            return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        cld = form.cleaned_data
+        instance = self.get_object_detail(request, cld['orders_id'])
+        if isinstance(instance, Exception):
+            return Response({'Detail': instance.args}, status=status.HTTP_400_BAD_REQUEST)
+        PayOrders.load_consume_orders([instance])
+        serializer = PayOrdersDetailSerializer(instance)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
 class BaseConsumeOrders(object):
     """
     子订单
@@ -167,6 +228,8 @@ class BaseConsumeOrders(object):
 
         pay_orders_id = _data['orders_id']
         dishes_detail_list = json.loads(_data['dishes_ids'])
+        consume_orders = []
+        consume_orders_ids = {}
         for index, business_dishes in enumerate(dishes_detail_list, 1):
             member_discount = 0
             other_discount = 0
@@ -174,24 +237,37 @@ class BaseConsumeOrders(object):
             for item in business_dishes['dishes_detail']:
                 total_amount = Decimal(total_amount) + Decimal(item['price']) * item['count']
             payable = Decimal(total_amount) - Decimal(member_discount) - Decimal(other_discount)
-            consume_data = {
-                'orders_id': self.make_consume_orders_id(pay_orders_id, index),
-                'user_id': _data['user_id'],
-                'dishes_ids': json.dumps(business_dishes['dishes_detail']),
-                'total_amount': str(total_amount),
-                'member_discount': member_discount,
-                'other_discount': other_discount,
-                'payable': str(payable),
-                'business_name': business_dishes['business_name'],
-                'business_id': business_dishes['business_id'],
-                'food_court_id': _data['food_court_id'],
-                'food_court_name': _data['food_court_name'],
-                'payment_mode': _data['payment_mode'],
-                'orders_type': _data['orders_type'],
-                'master_orders_id': pay_orders_id
-            }
-            serializer = ConsumeOrderSerializer(data=consume_data)
-            if serializer.is_valid():
-                serializer.save()
-            else:
-                raise Exception(serializer.errors)
+            consume_orders_ids[business_dishes['business_id']] = \
+                self.make_consume_orders_id(pay_orders_id, index)
+            consume_orders.append(ConsumeOrders(
+                orders_id=consume_orders_ids[business_dishes['business_id']],
+                user_id=_data['user_id'],
+                dishes_ids=json.dumps(business_dishes['dishes_detail']),
+                total_amount=str(total_amount),
+                member_discount=str(member_discount),
+                other_discount=str(other_discount),
+                payable=str(payable),
+                business_name=business_dishes['business_name'],
+                business_id=business_dishes['business_id'],
+                food_court_id=_data['food_court_id'],
+                food_court_name=_data['food_court_name'],
+                payment_mode=_data['payment_mode'],
+                orders_type=_data['orders_type'],
+                master_orders_id=pay_orders_id
+            ))
+
+        # 所有子订单在同一个事务中一次插入；主订单加排它锁，
+        # 支付回调重试时，已拆分过的主订单不再重复拆分
+        with transaction.atomic():
+            list(PayOrders.objects.select_for_update().filter(
+                orders_id=pay_orders_id).values_list('pk', flat=True))
+            if ConsumeOrders.objects.filter(master_orders_id=pay_orders_id).exists():
+                return list(ConsumeOrders.objects.filter(master_orders_id=pay_orders_id))
+            for item in consume_orders:
+                item.sync_money_cents()
+            ConsumeOrders.objects.bulk_create(consume_orders)
+            # 订单明细写入所属子订单ID（之前生成的订单没有明细，在此补齐）
+            if not OrdersDishes.set_consume_orders_ids(pay_orders_id, consume_orders_ids):
+                OrdersDishes.objects.bulk_create(OrdersDishes.make_instances(
+                    pay_orders_id, _data['user_id'], dishes_detail_list, consume_orders_ids))
+        return consume_orders
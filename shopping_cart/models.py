@@ -4,7 +4,7 @@ from __future__ import unicode_literals
 from django.db import models
 from django.utils.timezone import now
 from users.models import ConsumerUser
-from Business_App.bz_dishes.models import Dishes
+from Business_App.bz_dishes.caches import DishesCache
 from horizon.models import model_to_dict
 from horizon.main import (minutes_30_plus,
                           DatetimeEncode)
@@ -73,6 +73,40 @@ class ShoppingCart(models.Model):
         except Exception as e:
             return e
 
+    @classmethod
+    def get_objects_by_dishes_ids(cls, request, dishes_ids, for_update=False):
+        """
+        一次查询获取购物车中的多个菜品（数量须与dishes_ids中一致），有菜品不存在时返回异常
+        dishes_ids: [{'dishes_id': xxx, 'count': xxx}, ...]
+        """
+        try:
+            dishes_ids = [(int(item['dishes_id']), int(item['count'])) for item in dishes_ids]
+        except Exception as e:
+            return e
+        queryset = cls.objects.filter(user_id=request.user.id,
+                                      dishes_id__in=[item[0] for item in dishes_ids])
+        if for_update:
+            queryset = queryset.select_for_update()
+        instances_dict = {}
+        for instance in queryset:
+            instances_dict.setdefault((instance.dishes_id, instance.count), instance)
+        instances = []
+        for item in dishes_ids:
+            if item not in instances_dict:
+                return cls.DoesNotExist('Dishes ID %s does not existed in shopping cart' % item[0])
+            instances.append(instances_dict[item])
+        return instances
+
+    @classmethod
+    def delete_instances(cls, instances):
+        """
+        一条UPDATE语句删除购物车中的多个菜品（状态改为2：已删除）
+        """
+        pks = [item.pk for item in instances]
+        if not pks:
+            return 0
+        return cls.objects.filter(pk__in=pks).update(status=2, updated=now())
+
     @classmethod
     def get_shopping_cart_by_user_id(cls, request, food_court_id):
         kwargs = {'user_id': request.user.id,
@@ -81,9 +115,15 @@ class ShoppingCart(models.Model):
 
     @classmethod
     def get_shopping_cart_detail_by_user_id(cls, request, food_court_id):
+        instances = cls.get_shopping_cart_by_user_id(request, food_court_id)
+        return cls.make_shopping_cart_detail(instances)
+
+    @classmethod
+    def make_shopping_cart_detail(cls, instances):
         meal_ids = []
-        for item in cls.get_shopping_cart_by_user_id(request, food_court_id):
-            dishes_data = Dishes.get_dishes_detail_dict_with_user_info(pk=item.dishes_id)
+        instances = list(instances)
+        dishes_details = DishesCache().get_dishes_detail_dicts([item.dishes_id for item in instances])
+        for item, dishes_data in zip(instances, dishes_details):
             if isinstance(dishes_data, Exception):
                 continue
             dishes_dict = dishes_data
@@ -4,7 +4,7 @@ from shopping_cart.models import ShoppingCart
 from Business_App.bz_dishes.models import Dishes
 from horizon.serializers import BaseListSerializer, timezoneStringTostring
 from django.conf import settings
-from horizon.serializers import BaseSerializer
+from horizon.serializers import BaseSerializer, DateTimeField
 from horizon.decorators import has_permission_to_update
 import os
 
@@ -50,7 +50,7 @@ class ShoppingCartDetailSerializer(BaseSerializer):
     user_id = serializers.IntegerField()
     dishes_id = serializers.IntegerField()
     count = serializers.IntegerField()
-    updated = serializers.DateTimeField()
+    updated = DateTimeField()
     dishes_detail = serializers.DictField()
 
 
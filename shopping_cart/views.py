@@ -11,7 +11,8 @@ from shopping_cart.forms import (ShoppingCartCreateForm,
                                  ShoppingCartDeleteForm,
                                  ShoppingCartUpdateForm,
                                  ShoppingCartListForm)
-from Business_App.bz_dishes.models import Dishes
+from Business_App.bz_dishes.caches import DishesCache
+from horizon.serializers import paginate_queryset, make_page_results
 
 
 class ShoppingCartAction(generics.GenericAPIView):
@@ -26,7 +27,7 @@ class ShoppingCartAction(generics.GenericAPIView):
         return ShoppingCart.get_object_by_dishes_id(request, dishes_id)
 
     def get_dishes_detail(self, request, dishes_id):
-        return Dishes.get_dishes_detail_dict_with_user_info(pk=dishes_id)
+        return DishesCache().get_dishes_detail(dishes_id)
 
     def post(self, request, *args, **kwargs):
         """
@@ -109,8 +110,16 @@ class ShoppingCartList(generics.GenericAPIView):
     serializer_class = ShoppingCartListSerializer
     permission_classes = (IsOwnerOrReadOnly, )
 
-    def get_list_detail(self, request, food_court_id):
-        return ShoppingCart.get_shopping_cart_detail_by_user_id(request, food_court_id)
+    def get_list_detail(self, request, food_court_id, **kwargs):
+        """
+        数据库端分页，只获取当前页购物车数据的菜品详情
+        """
+        queryset = ShoppingCart.get_shopping_cart_by_user_id(request, food_court_id)
+        page = paginate_queryset(queryset, **kwargs)
+        if isinstance(page, Exception):
+            return page
+        instances, all_count, has_next = page
+        return ShoppingCart.make_shopping_cart_detail(instances), all_count, has_next
 
     def post(self, request, *args, **kwargs):
         """
@@ -124,12 +133,13 @@ class ShoppingCartList(generics.GenericAPIView):
         if not form.is_valid():
             return Response({'Detail': form.errors}, status=status.HTTP_400_BAD_REQUEST)
         cld = form.cleaned_data
-        _data = self.get_list_detail(request, cld['food_court_id'])
+        page = self.get_list_detail(request, **cld)
+        if isinstance(page, Exception):
+            return Response({'Detail': page.args}, status=status.HTTP_400_BAD_REQUEST)
+        _data, all_count, has_next = page
         serializer = ShoppingCartListSerializer(data=_data)
         if serializer.is_valid():
-            results = serializer.list_data(**cld)
-            if isinstance(request, Exception):
-                return Response({'Detail': results.args}, status=status.HTTP_400_BAD_REQUEST)
+            results = make_page_results(serializer.perfect_result(), all_count, has_next)
             return Response(results, status=status.HTTP_200_OK)
         else:
             return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
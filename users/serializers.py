@@ -3,7 +3,7 @@ from django.contrib.auth.models import User, Group
 from django.contrib.auth.hashers import make_password
 from rest_framework import serializers
 from users.models import ConsumerUser, IdentifyingCode
-from horizon.serializers import BaseListSerializer, timezoneStringTostring
+from horizon.serializers import BaseListSerializer, DateTimeField
 from django.conf import settings
 from horizon.models import model_to_dict
 from horizon import main
@@ -98,7 +98,7 @@ class UserDetailSerializer(serializers.Serializer):
     birthday = serializers.DateField(required=False)
     region = serializers.CharField(required=False)
     channel = serializers.CharField(default='YS')
-    last_login = serializers.DateTimeField()
+    last_login = DateTimeField()
 
     head_picture = serializers.ImageField()
 
@@ -112,7 +112,8 @@ class UserDetailSerializer(serializers.Serializer):
     def data(self):
         _data = super(UserDetailSerializer, self).data
         if _data.get('pk', None):
-            _data['last_login'] = timezoneStringTostring(_data['last_login'])
+            if _data['last_login'] is None:
+                _data['last_login'] = ''
             _data['head_picture_url'] = os.path.join(settings.WEB_URL_FIX, _data['head_picture'])
         return _data
 
@@ -2,8 +2,11 @@
 from __future__ import unicode_literals
 
 from django.db import models
+from django.db.models import F
 from django.utils.timezone import now
 from horizon.models import model_to_dict
+from horizon.money import (MoneyCentsMixin, cents_to_string,
+                           money_cents_expression, cents_string_expression)
 from horizon.main import minutes_30_plus, DatetimeEncode
 from django.db import transaction
 from decimal import Decimal
@@ -15,38 +18,51 @@ import json
 import datetime
 
 
-class OrdersManager(models.Manager):
-    def get(self, *args, **kwargs):
-        object_data = super(OrdersManager, self).get(*args, **kwargs)
-        if now() >= object_data.expires and object_data.payment_status == 0:
-            object_data.payment_status = 400
-        return object_data
-
-    def filter(self, *args, **kwargs):
-        object_data = super(OrdersManager, self).filter(*args, **kwargs)
-        for item in object_data:
-            if now() >= item.expires and item.payment_status == 0:
-                item.payment_status = 400
-        return object_data
-
-
-class Wallet(models.Model):
+class Wallet(MoneyCentsMixin, models.Model):
     """
     用户钱包
     """
     user_id = models.IntegerField('用户ID', db_index=True)
     balance = models.CharField('余额', max_length=16, default='0')
+    # 整数余额（单位：分），与balance同时写入，历史数据由backfill_money_cents补齐
+    balance_cents = models.BigIntegerField('余额（分）', null=True)
     password = models.CharField('支付密码', max_length=560)
     created = models.DateTimeField('创建时间', default=now)
     updated = models.DateTimeField('最后修改时间', auto_now=True)
     extend = models.TextField('扩展信息', default='', blank=True)
 
+    money_fields = ('balance',)
+
     class Meta:
         db_table = 'ys_wallet'
 
     def __unicode__(self):
         return self.user_id
 
+    @property
+    def balance_amount(self):
+        """
+        余额（单位：元，格式化为两位小数）
+        """
+        return cents_to_string(self.get_money_cents('balance'))
+
+    @classmethod
+    def update_balance(cls, user_id, amount_cents):
+        """
+        余额增减（单位：分，负数为扣减），单条UPDATE语句同时更新balance_cents和balance，
+        余额不足时不扣减
+        注：MySQL按顺序执行SET子句（后面的子句读到的是已更新的值），
+            所以两个字段各自由更新前的本字段计算，与子句顺序无关
+        返回：是否更新成功
+        """
+        cls.backfill_money_cents(user_id=user_id)
+        queryset = cls.objects.filter(user_id=user_id)
+        if amount_cents < 0:
+            queryset = queryset.filter(balance_cents__gte=-amount_cents)
+        return queryset.update(
+            balance_cents=F('balance_cents') + amount_cents,
+            balance=cents_string_expression(money_cents_expression('balance') + amount_cents)) > 0
+
     @classmethod
     def get_object(cls, **kwargs):
         try:
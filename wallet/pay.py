@@ -8,7 +8,7 @@ from horizon import main
 from django.conf import settings
 import os
 import json
-from decimal import Decimal
+import requests
 
 
 class WXPay(object):
@@ -16,7 +16,7 @@ class WXPay(object):
         if not isinstance(instance, PayOrders):
             raise Exception('Initialization Error')
         self.orders_id = instance.orders_id
-        self.total_fee = int(Decimal(instance.payable) * 100)
+        self.total_fee = instance.get_money_cents('payable')
         self.openid = request.user.out_open_id
         self.kwargs = {'detail': instance.dishes_ids_json_detail}
 
@@ -31,7 +31,10 @@ class WXPay(object):
                             total_fee=self.total_fee,
                             openid=self.openid,
                             **self.kwargs)
-        results = _wxpay.go_to_pay()
+        try:
+            results = _wxpay.go_to_pay()
+        except requests.RequestException as e:
+            return e
         if results.status_code != 200:
             return Exception(results.reason)
         # 解析xml
@@ -64,9 +67,5 @@ class WXPay(object):
         """
         if not isinstance(self.response_params, dict):
             return False
-        _sign = self.response_params.pop('sign')
-        maked_sign = main.make_sign_for_wxpay(self.response_params)
-
-        if maked_sign == _sign:
-            return True
-        return False
+        _sign = self.response_params.pop('sign', None)
+        return main.verify_sign_for_wxpay(self.response_params, _sign)
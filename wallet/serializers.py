@@ -1,5 +1,6 @@
 # -*- coding:utf8 -*-
 from django.contrib.auth.hashers import make_password
+from rest_framework import serializers
 from wallet.models import Wallet, WalletTradeDetail
 from horizon.decorators import has_permission_to_update
 from horizon.serializers import (BaseSerializer,
@@ -28,12 +29,14 @@ class WalletSerializer(BaseModelSerializer):
 
 
 class WalletResponseSerializer(BaseModelSerializer):
+    balance = serializers.CharField(source='balance_amount', read_only=True)
+
     class Meta:
         model = Wallet
         fields = ('user_id', 'balance', 'created', 'updated', 'extend')
 
 
-class WalletDetailSerializer(BaseSerializer):
+class WalletDetailSerializer(BaseModelSerializer):
     def __init__(self, instance=None, data=None, **kwargs):
         if data:
             if '_request' in kwargs:
@@ -49,4 +52,4 @@ class WalletDetailSerializer(BaseSerializer):
 
 
 class WalletDetailListSerializer(BaseListSerializer):
-    child = WalletDetailSerializer
+    child = WalletDetailSerializer()
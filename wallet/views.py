@@ -12,6 +12,8 @@ from wallet.forms import (WalletDetailListForm,
                           WalletCreateForm,
                           WalletTradeActionForm)
 from orders.models import PayOrders, ConsumeOrders
+from horizon.money import to_cents
+from django.db import transaction
 
 
 class WalletAction(generics.GenericAPIView):
@@ -72,6 +74,20 @@ class WalletTradeAction(generics.GenericAPIView):
         kwargs = {'orders_id': orders_id}
         return PayOrders.get_success_orders(**kwargs)
 
+    def get_balance_change(self, cld):
+        """
+        余额变化（单位：分）：充值增加，消费、取现扣减
+        """
+        try:
+            amount_cents = to_cents(cld['amount_of_money'])
+        except (ValueError, ArithmeticError):
+            return ValueError('Amount of money is not valid')
+        if amount_cents <= 0:
+            return ValueError('Amount of money must be greater than 0')
+        if cld['trade_type'] == 1:
+            return amount_cents
+        return -amount_cents
+
     def post(self, request, *args, **kwargs):
         form = WalletTradeActionForm(request.data)
         if not form.is_valid():
@@ -80,11 +96,20 @@ class WalletTradeAction(generics.GenericAPIView):
         _instance = self.get_orders_instance(cld['orders_id'])
         if isinstance(_instance, Exception):
             return Response({'Detail': _instance}, status=status.HTTP_400_BAD_REQUEST)
+        amount_cents = self.get_balance_change(cld)
+        if isinstance(amount_cents, Exception):
+            return Response({'Detail': amount_cents.args}, status=status.HTTP_400_BAD_REQUEST)
         serializer = WalletDetailSerializer(data=cld, _request=request)
         if serializer.is_valid():
-            serializer.save()
+            # 交易明细与余额增减在同一事务中完成，余额不足时交易明细一并回滚
+            with transaction.atomic():
+                serializer.save()
+                if not Wallet.update_balance(request.user.id, amount_cents):
+                    transaction.set_rollback(True)
+                    return Response({'Detail': 'Balance is not enough'},
+                                    status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response({'Detail': serializer.eerors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'Detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class WalletTradeDetailList(generics.GenericAPIView):
@@ -96,7 +121,7 @@ class WalletTradeDetailList(generics.GenericAPIView):
     permission_classes = (IsOwnerOrReadOnly, )
 
     def get_details_list(self, request):
-        return []
+        return WalletTradeDetail.objects.filter(user_id=request.user.id)
 
     def post(self, request, *args, **kwargs):
         form = WalletDetailListForm(request.data)